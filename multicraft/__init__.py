@@ -1,11 +1,64 @@
 """
 Interact with your Minecraft server from hosts that use [Multicraft](https://www.multicraft.org/) using Python.
 """
+import importlib
+
 class MulticraftException(Exception): pass
+class MulticraftTimeout(MulticraftException): pass
+class MulticraftCancelled(MulticraftException): pass
+class MulticraftCircuitOpen(MulticraftException): pass
 
 __version__ = '0.0.2'
 
 from .hosts import *
 from .model import *
-from .api import MulticraftAPI
-from .app import MulticraftApp
+from . import hosts as _hosts, model as _model
+
+# Loaded on first use so "import multicraft" does not pull in tkinter, requests or the process pool
+_lazy = {
+    'MulticraftAPI': 'api',
+    'AsyncMulticraftAPI': 'aio',
+    'ServerTopology': 'topology',
+    'Dashboard': 'dashboard',
+    'MulticraftRouter': 'router',
+    'RateLimiter': 'limits',
+    'CircuitBreaker': 'breaker',
+    'ScheduleIndex': 'schedules',
+    'SpreadPlan': 'schedules',
+    'plan_spread': 'schedules',
+    'CommandSpec': 'provision',
+    'CommandSync': 'provision',
+    'AccessSync': 'provision',
+    'NameResolver': 'resolve',
+    'pack_model': 'codec',
+    'pack_models': 'codec',
+    'unpack_model': 'codec',
+    'iter_unpack_models': 'codec',
+    'export_server': 'export',
+    'export_many': 'export',
+    'freeze': 'snapshot',
+    'DatabaseCache': 'databases',
+    'FileLease': 'databases',
+    'MulticraftApp': 'app',
+    'LogEvent': 'logs',
+    'LogPatterns': 'logs',
+    'LogTail': 'logs',
+    'LogAnalysis': 'logs',
+    'DEFAULT_PATTERNS': 'logs',
+    'parse_log_line': 'logs',
+    'extract_events': 'logs',
+    'parse_log': 'logs'
+}
+
+# Star imports go through __getattr__ for these lazy names. The rest (MulticraftApp needs tkinter, the tools pull in asyncio, http.server, shelve or a process pool) must be imported by name
+__all__ = ['MulticraftException', 'MulticraftTimeout', 'MulticraftCancelled', 'MulticraftCircuitOpen'] + _hosts.__all__ + _model.__all__ + ['MulticraftAPI', 'MulticraftRouter', 'RateLimiter', 'CircuitBreaker']
+
+def __getattr__(name:str):
+    module = _lazy.get(name)
+    if module is None: raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals().keys()) | set(_lazy.keys()))
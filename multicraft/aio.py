@@ -0,0 +1,77 @@
+"""
+Asyncio client. Every MulticraftAPI method is available as a coroutine that runs the call in a worker thread.
+"""
+import asyncio
+import functools
+import inspect
+
+from . import MulticraftTimeout, MulticraftCancelled
+from .model import Bound
+
+__all__ = ['AsyncMulticraftAPI']
+
+class AsyncMulticraftAPI:
+    def __init__(self, api):
+        """
+        Create a new asyncio client around this client. Models returned by it are bound to the async client, so Server.start() and friends return coroutines.
+
+        :param api: The client to wrap
+        :type api: MulticraftAPI
+        """
+        self.api = api
+
+    def __repr__(self):
+        return f"AsyncMulticraftAPI(url='{self.api.url}', user='{self.api.user}')"
+
+    # Internal
+
+    def _bind(self, res):
+        if isinstance(res, Bound): res.bind(self)
+        elif isinstance(res, list):
+            for x in res: self._bind(x)
+        elif isinstance(res, dict):
+            for x in res.values(): self._bind(x)
+        return res
+
+    def __getattr__(self, name:str):
+        attr = getattr(self.api, name)
+        if name.startswith('_') or not callable(attr): return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kw):
+            return self._bind(await asyncio.to_thread(attr, *args, **kw))
+        return wrapper
+
+    # Bulk
+
+    async def bulk(self, method, items:list, max_workers:int=8, return_exceptions:bool=False, cancel=None, timeout:float=None) -> list:
+        """
+        Call this method once for every item concurrently
+
+        :param method: The name of a method on this client (for example "start_server") or a callable, which may return a coroutine
+        :type method: str|Callable
+        :param items: The arguments for each call. Tuples are unpacked into positional arguments
+        :type items: list
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        :param return_exceptions: Return exceptions in place of results instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :param cancel: Calls that have not started once this event is set raise MulticraftCancelled, defaults to None
+        :type cancel: threading.Event|asyncio.Event, optional
+        :param timeout: The maximum seconds each call may take before MulticraftTimeout is raised, defaults to None
+        :type timeout: float, optional
+        :return: The results in the same order as items
+        :rtype: list
+        """
+        fn = getattr(self, method) if isinstance(method, str) else method
+        semaphore = asyncio.Semaphore(max(1, int(max_workers)))
+
+        async def call(item):
+            async with semaphore:
+                if cancel is not None and cancel.is_set(): raise MulticraftCancelled('Cancelled before it started')
+                res = fn(*item) if isinstance(item, tuple) else fn(item)
+                if inspect.isawaitable(res):
+                    try: res = await asyncio.wait_for(res, timeout)
+                    except asyncio.TimeoutError as err: raise MulticraftTimeout(f"Call exceeded the {timeout}s timeout") from err
+                return res
+        return await asyncio.gather(*[call(x) for x in items], return_exceptions=return_exceptions)
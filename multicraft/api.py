@@ -1,16 +1,33 @@
 import os
 import datetime
-import requests
 import hmac
 import hashlib
 import json
-
-from . import MulticraftException, User, Role, Mode, Player, Command, Server, ServerStatus, ChatMessage, ServerResources, Schedule, ScheduleStatus, Database, Backup
+import time
+import copy
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .lazy import lazy_models
+from .limits import RateLimiter
+from .breaker import CircuitBreaker
+from . import MulticraftException, MulticraftTimeout, MulticraftCancelled, User, Role, Mode, Player, Command, Server, ServerStatus, ChatMessage, ServerResources, Schedule, ScheduleStatus, Database, Backup
+from .model import ROLES, MODES
+
+log = logging.getLogger(__name__)
+
+# Calls that only read, so sending one twice is harmless. getOwnApiKey is left out, with generate=1 it makes a new key
+IDEMPOTENT = frozenset([
+    'findCommands', 'findPlayers', 'findSchedules', 'getCommand', 'getCurrentUser', 'getDatabaseInfo', 'getPlayer', 'getSchedule', 'getServer', 'getServerBackupStatus',
+    'getServerChat', 'getServerLog', 'getServerResources', 'getServerStatus', 'getUserFtpAccess', 'getUserId', 'getUserRole', 'listCommands', 'listPlayers', 'listSchedules',
+    'listServersByConnection', 'listServersByOwner'
+])
 
 __all__ = ['MulticraftAPI']
 
 class MulticraftAPI:
-    def __init__(self, url:str, user:str, key:str=None):
+    def __init__(self, url:str, user:str, key:str=None, timeout:float|tuple[float, float]=(10.0, 60.0), deadline:float=None, retries:int=0, rate_limit:float=None, pool_size:int=10, circuit_breaker:CircuitBreaker|bool=None):
         """
         Create a new instance of Multicraft API
 
@@ -20,14 +37,50 @@ class MulticraftAPI:
         :type user: str
         :param key: The API key to login with, defaults to os.getenv('KEY') if None
         :type key: str, optional
+        :param timeout: The connect and read timeout in seconds, or one number for both, defaults to (10.0, 60.0)
+        :type timeout: float|tuple[float, float], optional
+        :param deadline: The maximum seconds a call may take including retries, defaults to None
+        :type deadline: float, optional
+        :param retries: How many times a call is retried after a timeout or connection error. Calls that may change something (anything not in IDEMPOTENT, including getOwnApiKey) are only retried when the connection could not be made, so they are never sent twice, defaults to 0
+        :type retries: int, optional
+        :param rate_limit: The maximum number of calls per second, defaults to None
+        :type rate_limit: float, optional
+        :param pool_size: The number of connections kept open to the panel, defaults to 10
+        :type pool_size: int, optional
+        :param circuit_breaker: Fail fast with MulticraftCircuitOpen while the panel is down. True uses the breaker shared by every client of this url, defaults to None
+        :type circuit_breaker: CircuitBreaker|bool, optional
         """
         self.url = str(url)
         self.user = str(user)
         self.key = os.getenv('KEY') if key is None else str(key)
         self.user_agent = 'multicraft (https://github.com/legopitstop/multicraft-py/)'
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = int(retries)
+        self.rate_limiter = None if rate_limit is None else RateLimiter(rate_limit)
+        self.pool_size = int(pool_size)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.circuit_breaker = CircuitBreaker.for_url(self.url) if circuit_breaker is True else circuit_breaker or None
+        self._listeners = []
 
     # Internal
 
+    @property
+    def session(self):
+        """
+        The requests session of this client. Each client keeps its own connection pool.
+        """
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+        return self._session
+
     def _generateSignature(self, params:dict) -> str:
         signature = ''
         for param in self._reduce(params):
@@ -46,18 +99,59 @@ class MulticraftAPI:
         """
         Internal method
         """
+        original = params
         params = self._reduce(params)
         params["_MulticraftAPIMethod"] = str(method)
         params["_MulticraftAPIUser"] = self.user
         params["_MulticraftAPIKey"] = self._generateSignature(params)
 
-        res = requests.post(self.url, params, headers={'user-agent': self.user_agent})
-        data = json.loads(res.text)
+        import requests
+        start = time.monotonic()
+        attempt = 0
+        read_only = method in IDEMPOTENT
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(None if self.deadline is None else self.deadline):
+            raise MulticraftTimeout(f"{method} exceeded the {self.deadline}s deadline waiting for the rate limit")
+        while True:
+            timeout = self.timeout
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - start)
+                if remaining <= 0: raise MulticraftTimeout(f"{method} exceeded the {self.deadline}s deadline")
+                timeout = tuple(min(x, remaining) for x in timeout) if isinstance(timeout, tuple) else remaining if timeout is None else min(timeout, remaining)
+            try:
+                data = self._post(method, params, timeout)
+                break
+            except (requests.Timeout, requests.ConnectionError) as err:
+                # The panel may already have run the call unless the connection was never made
+                if attempt >= self.retries or not (read_only or isinstance(err, requests.ConnectTimeout)):
+                    if isinstance(err, requests.Timeout): raise MulticraftTimeout(f"{method} timed out: {err}") from err
+                    raise MulticraftException(f"{method} failed: {err}") from err
+                attempt += 1
+                delay = min(0.25 * 2 ** attempt, 5.0)
+                if self.deadline is not None: delay = max(0.0, min(delay, self.deadline - (time.monotonic() - start)))
+                time.sleep(delay)
         if data.get('success'):
+            for listener in list(self._listeners):
+                # The call already succeeded, a broken listener must not make it look failed
+                try: listener(method, original, data.get('data'))
+                except Exception: log.exception(f"Listener {listener!r} failed for {method}")
             return data.get('data')
         err = str(data['errors'][0]).replace('&quot;', '"')
         raise MulticraftException(err)
 
+    def _post(self, method:str, params:dict, timeout) -> dict:
+        breaker = self.circuit_breaker
+        if breaker is not None: breaker.allow()
+        start = time.monotonic()
+        try:
+            res = self.session.post(self.url, params, headers={'user-agent': self.user_agent}, timeout=timeout)
+            try: data = json.loads(res.text)
+            except ValueError as err: raise MulticraftException(f"{method} failed: HTTP {res.status_code}, invalid response") from err
+        except Exception:
+            if breaker is not None: breaker.record(False, time.monotonic() - start)
+            raise
+        if breaker is not None: breaker.record(True, time.monotonic() - start)
+        return data
+
     # Config
     
     def set_user_agent(self, user_agent_string:str):
@@ -69,6 +163,80 @@ class MulticraftAPI:
         """
         self.user_agent = str(user_agent_string)
 
+    def with_options(self, timeout:float|tuple[float, float]=..., deadline:float=..., retries:int=...):
+        """
+        Get a copy of this client with other timeouts, for a single call or a group of calls
+
+        api.with_options(timeout=2, deadline=5).get_server_status(1)
+
+        :param timeout: The connect and read timeout in seconds, or one number for both, defaults to this client's
+        :type timeout: float|tuple[float, float], optional
+        :param deadline: The maximum seconds a call may take including retries, defaults to this client's
+        :type deadline: float, optional
+        :param retries: How many times a call is retried after a timeout or connection error (only connect timeouts for calls that change something), defaults to this client's
+        :type retries: int, optional
+        :return: The copy
+        :rtype: MulticraftAPI
+        """
+        self.session # Created first so the copy shares this client's connection pool
+        res = copy.copy(self)
+        if timeout is not ...: res.timeout = timeout
+        if deadline is not ...: res.deadline = deadline
+        if retries is not ...: res.retries = int(retries)
+        return res
+
+    # Listeners
+
+    def add_listener(self, listener):
+        """
+        Call listener(method, params, result) after every successful call, for example to keep a cache up to date. Copies made with with_options() share listeners. Exceptions raised by a listener are logged and do not fail the call.
+
+        :param listener: The function to call. method is the Multicraft method name such as "createSchedule"
+        :type listener: Callable[[str, dict, Any], None]
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop calling this listener
+
+        :param listener: The function to remove
+        :type listener: Callable[[str, dict, Any], None]
+        """
+        if listener in self._listeners: self._listeners.remove(listener)
+
+    # Bulk
+
+    def bulk(self, method, items:list, max_workers:int=8, return_exceptions:bool=False, cancel=None) -> list:
+        """
+        Call this method once for every item concurrently
+
+        :param method: The name of a method on this client (for example "start_server") or a callable
+        :type method: str|Callable
+        :param items: The arguments for each call. Tuples are unpacked into positional arguments
+        :type items: list
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        :param return_exceptions: Return exceptions in place of results instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :param cancel: Calls that have not started once this event is set raise MulticraftCancelled, defaults to None
+        :type cancel: threading.Event, optional
+        :return: The results in the same order as items
+        :rtype: list
+        """
+        fn = getattr(self, method) if isinstance(method, str) else method
+        def call(item):
+            try:
+                if cancel is not None and cancel.is_set(): raise MulticraftCancelled('Cancelled before it started')
+                return fn(*item) if isinstance(item, tuple) else fn(item)
+            except Exception as err:
+                if return_exceptions: return err
+                raise
+        items = list(items)
+        if len(items) == 0: return []
+        with ThreadPoolExecutor(max(1, min(int(max_workers), len(items)))) as pool:
+            return list(pool.map(call, items))
+
     # User functions
 
     def get_current_user(self) -> User:
@@ -98,7 +266,7 @@ class MulticraftAPI:
         }
         res = self._call('getUserRole', data)['role']
         if res == '': return None
-        return Role[str(res)]
+        return ROLES[str(res)]
 
     def set_user_role(self, user_id:int, server_id:int, role:Role) -> None:
         """
@@ -136,7 +304,7 @@ class MulticraftAPI:
             'server_id': int(server_id)
         })['mode']
         if res == '': return None
-        return Mode[str(res)]
+        return MODES[str(res)]
 
     def set_user_ftp_access(self, user_id:int, server_id:int, mode:Mode) -> None:
         """
@@ -191,19 +359,23 @@ class MulticraftAPI:
 
     # Player functions
 
-    def list_players(self, server_id:int) -> dict[str, str]:
+    def list_players(self, server_id:int, lazy:bool=False) -> dict[str, str]|dict[str, Player]:
         """
         Get a list of all players
 
         :param server_id: The id of the server
         :type server_id: int
-        :return: The players {ID: NAME}
-        :rtype: dict
+        :param lazy: Return lazy Players that fetch their full record on first access, defaults to False
+        :type lazy: bool, optional
+        :return: The players {ID: NAME}, or {ID: Player} if lazy
+        :rtype: dict[str, str]|dict[str, Player]
         """
         res = self._call('listPlayers', {
             'server_id': int(server_id)
         })['Players']
-        return {} if isinstance(res, list) else res
+        if isinstance(res, list): return {}
+        if lazy: return lazy_models(Player, self.get_player, res, api=self)
+        return res
 
     def get_player(self, player_id:int) -> Player:
         """
@@ -217,7 +389,7 @@ class MulticraftAPI:
         res = self._call('getPlayer', {
             'id': int(player_id)
         })['Player']
-        return Player.from_json(res)
+        return Player.from_json(res).bind(self)
 
     def find_players(self, server_id:int, field:list[str], value:list[str]) -> dict[str, str]:
         """
@@ -277,7 +449,7 @@ class MulticraftAPI:
             'op_command': int(op_command)
         }
         id = self._call('createPlayer', data)['id']
-        return Player(id, **data)
+        return Player(id, data['name'], data['server_id']).bind(self)
 
     def delete_player(self, player_id:int):
         """
@@ -308,19 +480,23 @@ class MulticraftAPI:
 
     # Command functions
 
-    def list_commands(self, server_id:int) -> dict[str,str]:
+    def list_commands(self, server_id:int, lazy:bool=False) -> dict[str, str]|dict[str, Command]:
         """
         Get a list of all commands
 
         :param server_id: The id of the server
         :type server_id: int
-        :return: The commands {ID: NAME}
-        :rtype: dict
+        :param lazy: Return lazy Commands that fetch their full record on first access, defaults to False
+        :type lazy: bool, optional
+        :return: The commands {ID: NAME}, or {ID: Command} if lazy
+        :rtype: dict[str, str]|dict[str, Command]
         """
         res = self._call('listCommands', {
             'server_id': int(server_id)
         })['Commands']
-        return {} if isinstance(res, list) else res
+        if isinstance(res, list): return {}
+        if lazy: return lazy_models(Command, self.get_command, res, api=self)
+        return res
 
     def find_commands(self, server_id:int, field:list[str], value:list[str]) -> dict[int, str]:
         """
@@ -356,7 +532,7 @@ class MulticraftAPI:
         res = self._call('getCommand', {
             'id': int(command_id)
         })['Command']
-        return Command.from_json(res)
+        return Command.from_json(res).bind(self)
 
     def update_command(self, command_id:int, field:list[str], value:list[str]) -> None:
         """
@@ -404,7 +580,7 @@ class MulticraftAPI:
             'run': str(run)
         }
         id = self._call('createCommand', data)['id']
-        return Command(id, **data)
+        return Command(id, **data).bind(self)
 
     def delete_command(self, command_id:int) -> None:
         """
@@ -419,26 +595,39 @@ class MulticraftAPI:
 
     # Server functions
 
-    def list_servers_by_owner(self, user_id:int) -> dict[str,str]:
+    def list_servers_by_owner(self, user_id:int, lazy:bool=False) -> dict[str, str]|dict[str, Server]:
         """
         Get a list of all servers that this user owns
 
         :param user_id: The id of the user
         :type user_id: int
-        :return: The servers that this user owns {ID: NAME}
-        :rtype: dict
+        :param lazy: Return lazy Servers that fetch their full record on first access, defaults to False
+        :type lazy: bool, optional
+        :return: The servers that this user owns {ID: NAME}, or {ID: Server} if lazy
+        :rtype: dict[str, str]|dict[str, Server]
         """
         res = self._call('listServersByOwner', {
             'user_id': int(user_id)
         })['Servers']
-        return {} if isinstance(res, list) else res
+        if isinstance(res, list): return {}
+        if lazy: return lazy_models(Server, self.get_server, res, api=self)
+        return res
 
-    # TODO - Access denied
-    def list_servers_by_connection(self, connection_id:int):
+    def list_servers_by_connection(self, connection_id:int) -> dict[str,str]:
+        """
+        Get a list of all servers that run on this connection (daemon)
+
+        Some hosts deny access to this method. See ServerTopology for a cached daemon to servers map.
+
+        :param connection_id: The id of the connection (daemon)
+        :type connection_id: int
+        :return: The servers on this connection {ID: NAME}
+        :rtype: dict
+        """
         res = self._call('listServersByConnection', {
             'connection_id': int(connection_id)
-        })
-        return res
+        })['Servers']
+        return {} if isinstance(res, list) else res
 
     # TODO Access denied
     def update_server(self, server_id:int, field:list[str], value:list[str]):
@@ -570,7 +759,7 @@ class MulticraftAPI:
             'id': int(server_id)
         })
         res['Server']['id'] = server_id
-        return Server.from_json(res['Server'])
+        return Server.from_json(res['Server']).bind(self)
 
     def get_server_status(self, server_id:int, player_list:bool=False) -> ServerStatus:
         """
@@ -634,19 +823,23 @@ class MulticraftAPI:
 
     # Schedule functions
 
-    def list_schedules(self, server_id:int) -> dict[str, str]:
+    def list_schedules(self, server_id:int, lazy:bool=False) -> dict[str, str]|dict[str, Schedule]:
         """
         Get a list of all schedules
 
         :param server_id: The id of the server
         :type server_id: int
-        :return: The schedules {ID: NAME}
-        :rtype: dict
+        :param lazy: Return lazy Schedules that fetch their full record on first access, defaults to False
+        :type lazy: bool, optional
+        :return: The schedules {ID: NAME}, or {ID: Schedule} if lazy
+        :rtype: dict[str, str]|dict[str, Schedule]
         """
         res = self._call('listSchedules', {
             'server_id': int(server_id)
         })['Schedules']
-        return {} if isinstance(res, list) else res
+        if isinstance(res, list): return {}
+        if lazy: return lazy_models(Schedule, self.get_schedule, res, api=self)
+        return res
 
     def find_schedules(self, server_id:int, field:list[str], value:list[str]) -> dict[str,str]:
         """
@@ -699,7 +892,7 @@ class MulticraftAPI:
         res = self._call('getSchedule', {
             'id': int(schedule_id)
         })['Schedule']
-        return Schedule.from_json(res)
+        return Schedule.from_json(res).bind(self)
 
     def create_schedule(self, server_id:int, name:str, ts:datetime.datetime,  command:int, interval:int=0, status:ScheduleStatus=ScheduleStatus.scheduled, _for:int=0) -> Schedule:
         """
@@ -734,7 +927,7 @@ class MulticraftAPI:
             'for': int(_for)
         }
         id = self._call('createSchedule', data)['id']
-        return Schedule(id, **data)
+        return Schedule(id, **data).bind(self)
 
     def delete_schedule(self, schedule_id:int) -> None:
         """
@@ -761,7 +954,8 @@ class MulticraftAPI:
         res = self._call('getDatabaseInfo', {
             'server_id': int(server_id)
         })
-        return Database.from_json(res)
+        res['server_id'] = int(server_id)
+        return Database.from_json(res).bind(self)
 
     def create_database(self, server_id:int, name:str=None, password:str=None) -> Database:
         """
@@ -782,7 +976,8 @@ class MulticraftAPI:
             'password': str(password)
         }
         res = self._call('createDatabase', data)
-        return Database.from_json(res)
+        res['server_id'] = int(server_id)
+        return Database.from_json(res).bind(self)
 
     def change_database_password(self, server_id:int, database_id:int=None, password:str=None) -> Database:
         """
@@ -802,7 +997,8 @@ class MulticraftAPI:
             'database_id': int(server_id) if database_id is None else int(database_id),
             'password': str(password)
         })
-        return Database.from_json(res)
+        res['server_id'] = int(server_id)
+        return Database.from_json(res).bind(self)
 
     def delete_database(self, server_id:int, database_id:int=None) -> None:
         """
@@ -1,9 +1,13 @@
 """
 A bear boned multicraft client UI
 """
-from tkinter import Tk, Event, Label, Listbox, Frame, Button
+from tkinter import Tk, Event, Label, Listbox, Frame, Button, Text, Entry, Scrollbar
+from tkinter.ttk import Treeview, Combobox
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import queue
 
-from . import MulticraftAPI
+from . import MulticraftAPI, LogTail
 
 __all__ = ['MulticraftApp']
 
@@ -15,26 +19,122 @@ def page(cls):
         pages.append(cls)
     return wrapper()
 
+class Worker:
+    def __init__(self, root:Tk, max_workers:int=4, interval:int=50):
+        """
+        Run API calls on background threads and hand the results back to the Tk loop
+
+        :param root: The Tk root that polls the result queue
+        :type root: Tk
+        :param max_workers: The number of background threads, defaults to 4
+        :type max_workers: int, optional
+        :param interval: Milliseconds between polls of the result queue, defaults to 50
+        :type interval: int, optional
+        """
+        self.root = root
+        self.interval = int(interval)
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='multicraft')
+        self._queue = queue.Queue()
+        self._after = None
+
+    def submit(self, fn, *args, callback=None, errback=None):
+        """
+        Call fn(*args) on a background thread. callback(result) or errback(exception) is called on the Tk thread once it is done.
+
+        :param fn: The function to call
+        :type fn: Callable
+        :param callback: Called with the result, defaults to None
+        :type callback: Callable, optional
+        :param errback: Called with the exception, defaults to None
+        :type errback: Callable, optional
+        :return: The future of the call
+        :rtype: Future
+        """
+        def run():
+            try: self._queue.put((callback, fn(*args), None))
+            except Exception as err: self._queue.put((errback, None, err))
+        self.pending += 1
+        return self._executor.submit(run)
+
+    def start(self):
+        """
+        Start polling the result queue
+        """
+        if self._after is None: self._after = self.root.after(self.interval, self._poll)
+
+    def stop(self):
+        """
+        Stop polling and drop any calls that have not started yet
+        """
+        if self._after is not None: self.root.after_cancel(self._after)
+        self._after = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        while True:
+            try: fn, res, err = self._queue.get_nowait()
+            except queue.Empty: break
+            self.pending -= 1
+            if fn is not None: fn(res if err is None else err)
+        self._after = self.root.after(self.interval, self._poll)
+
 class Page:
-    def __init__(self, frame, api:MulticraftAPI, name):
+    name = 'Page'
+    interval = 5000
+
+    def __init__(self, frame, app):
         self.frame = frame
-        self.api = api
-        self.name = name
+        self.app = app
+        self.api = app.api
         
         frm = Frame(frame)
         self._nav_lbl = Label(frm, text='Servers > legopitstop\'s Minecraft Server')
         self._nav_lbl.grid(row=0, column=0, sticky='nwe')
         frm.grid(row=0, column=0, sticky='ew')
 
+    def run(self, label:str, fn, *args, button:Button=None, callback=None):
+        """
+        Run an API call in the background and show its pending and complete state in the status bar
+
+        :param label: The name of the action, for example "Start"
+        :type label: str
+        :param fn: The API method to call
+        :type fn: Callable
+        :param button: A button to disable while the call is pending, defaults to None
+        :type button: Button, optional
+        :param callback: Called with the result on the Tk thread, defaults to None
+        :type callback: Callable, optional
+        """
+        if button is not None: button.configure(state='disabled')
+        self.app.set_status(f'{label}...')
+
+        def done(res):
+            if button is not None: button.configure(state='normal')
+            self.app.set_status(f'{label}: done')
+            if callback is not None: callback(res)
+
+        def failed(err):
+            if button is not None: button.configure(state='normal')
+            self.app.set_status(f'{label}: {err}')
+        self.app.worker.submit(fn, *args, callback=done, errback=failed)
+
+    def refresh(self):
+        """
+        Reload this page's data. Called when the page is shown and every interval milliseconds while it stays visible
+        """
+
 @page
 class HomePage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Home')
-        self._status_lbl = Label(frame, text='P')
-        self._start_btn = Button(frame, text='Start', command=lambda s=self.api.server: self.api.start_server(s))
-        self._stop_btn = Button(frame, text='Stop', command=lambda s=self.api.server: self.api.stop_server(s))
-        self._restart_btn = Button(frame, text='Restart', command=lambda s=self.api.server: self.api.restart_server(s))
-        self._kill_btn = Button(frame, text='Kill', command=lambda s=self.api.server: self.api.kill_server(s))
+    name = 'Home'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
+        self._status_lbl = Label(frame, text='...')
+        self._start_btn = Button(frame, text='Start', command=lambda: self.action('Start', self.api.start_server, self._start_btn))
+        self._stop_btn = Button(frame, text='Stop', command=lambda: self.action('Stop', self.api.stop_server, self._stop_btn))
+        self._restart_btn = Button(frame, text='Restart', command=lambda: self.action('Restart', self.api.restart_server, self._restart_btn))
+        self._kill_btn = Button(frame, text='Kill', command=lambda: self.action('Kill', self.api.kill_server, self._kill_btn))
 
         self._status_lbl.grid(row=1, column=0)
         self._start_btn.grid(row=1, column=1)
@@ -42,52 +142,235 @@ class HomePage(Page):
         self._restart_btn.grid(row=1, column=3)
         self._kill_btn.grid(row=1, column=4)
 
+    def action(self, label:str, fn, button:Button):
+        self.run(label, fn, self.api.server, button=button, callback=lambda res: self.refresh())
+
+    def refresh(self):
+        def update(status):
+            self._status_lbl.configure(text=f'{status.status.value} ({status.online_players}/{status.max_players})')
+        self.app.worker.submit(self.api.get_server_status, self.api.server, callback=update, errback=lambda err: self._status_lbl.configure(text='unknown'))
+
 @page
 class ConsolePage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Console')
-        Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
+    name = 'Console'
+    max_lines = 1000
+    interval = 2000
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
+        self.tail = LogTail(self.api, self.api.server)
+        self._buffer = []
+        self._flush_id = None
+        self._polling = False
+
+        body = Frame(frame)
+        self._text = Text(body, state='disabled', wrap='none')
+        scroll = Scrollbar(body, command=self._text.yview)
+        self._text.configure(yscrollcommand=scroll.set)
+        self._text.grid(row=0, column=0, sticky='nesw')
+        scroll.grid(row=0, column=1, sticky='ns')
+        body.grid_rowconfigure(0, weight=1)
+        body.grid_columnconfigure(0, weight=1)
+        body.grid(row=1, column=0, sticky='nesw')
+
+        cmd = Frame(frame)
+        self._cmd_ent = Entry(cmd)
+        self._cmd_ent.bind('<Return>', lambda e: self.send())
+        self._send_btn = Button(cmd, text='Send', command=self.send)
+        self._cmd_ent.grid(row=0, column=0, sticky='ew')
+        self._send_btn.grid(row=0, column=1)
+        cmd.grid_columnconfigure(0, weight=1)
+        cmd.grid(row=2, column=0, sticky='ew')
+
+    def refresh(self):
+        if self._polling: return
+        self._polling = True
+        self.app.worker.submit(self.tail.poll, callback=self._received, errback=self._failed)
+
+    def send(self):
+        command = self._cmd_ent.get().strip()
+        if command == '': return
+        self._cmd_ent.delete(0, 'end')
+        self.run('Send', self.api.send_console_command, self.api.server, command, button=self._send_btn, callback=lambda res: self.refresh())
+
+    def _received(self, lines:list[str]):
+        self._polling = False
+        if len(lines) == 0: return
+        self._buffer.extend(lines[-self.max_lines:])
+        if self._flush_id is None: self._flush_id = self.frame.after_idle(self._flush)
+
+    def _failed(self, err:Exception):
+        self._polling = False
+        self.app.set_status(f'Console: {err}')
+
+    def _flush(self):
+        self._flush_id = None
+        lines, self._buffer = self._buffer[-self.max_lines:], []
+        at_end = self._text.yview()[1] >= 1.0
+        self._text.configure(state='normal')
+        self._text.insert('end', '\n'.join(lines) + '\n')
+        count = int(self._text.index('end-1c').split('.')[0]) - 1
+        if count > self.max_lines: self._text.delete('1.0', f'{count - self.max_lines + 1}.0')
+        self._text.configure(state='disabled')
+        if at_end: self._text.see('end')
 
 @page
 class ChatPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Chat')
+    name = 'Chat'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 @page
 class PlayersPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Players')
-        Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
+    name = 'Players'
+    interval = 30000
+    rows = 25
+    cache_size = 500
+    columns = ('status', 'op', 'banned', 'lastseen')
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
+        self.ids = []
+        self.names = {}
+        self.offset = 0
+        self._details = OrderedDict()
+        self._fetching = set()
+        self._listing = False
+
+        search = Frame(frame)
+        self._field_cmb = Combobox(search, values=['name', 'ip', 'status', 'banned', 'op', 'quitreason'], state='readonly', width=10)
+        self._field_cmb.set('name')
+        self._value_ent = Entry(search)
+        self._value_ent.bind('<Return>', lambda e: self.refresh())
+        self._count_lbl = Label(search)
+        self._field_cmb.grid(row=0, column=0)
+        self._value_ent.grid(row=0, column=1, sticky='ew')
+        Button(search, text='Find', command=self.refresh).grid(row=0, column=2)
+        self._count_lbl.grid(row=0, column=3)
+        search.grid_columnconfigure(1, weight=1)
+        search.grid(row=2, column=0, sticky='ew')
+
+        body = Frame(frame)
+        self._tree = Treeview(body, columns=self.columns, height=self.rows)
+        self._tree.heading('#0', text='name')
+        for column in self.columns: self._tree.heading(column, text=column)
+        self._scroll = Scrollbar(body, command=self._yview)
+        self._tree.grid(row=0, column=0, sticky='nesw')
+        self._scroll.grid(row=0, column=1, sticky='ns')
+        body.grid_rowconfigure(0, weight=1)
+        body.grid_columnconfigure(0, weight=1)
+        body.grid(row=1, column=0, sticky='nesw')
+        for i in range(self.rows): self._tree.insert('', 'end', iid=str(i), text='')
+        self._tree.bind('<MouseWheel>', lambda e: self.scroll_to(self.offset - (1 if e.delta > 0 else -1) * 3))
+        self._tree.bind('<Button-4>', lambda e: self.scroll_to(self.offset - 3))
+        self._tree.bind('<Button-5>', lambda e: self.scroll_to(self.offset + 3))
+
+    def refresh(self):
+        if self._listing: return
+        self._listing = True
+        value = self._value_ent.get().strip()
+        if value == '': self.app.worker.submit(self.api.list_players, self.api.server, callback=self._listed, errback=self._failed)
+        else: self.app.worker.submit(self.api.find_players, self.api.server, [self._field_cmb.get()], [value], callback=self._listed, errback=self._failed)
+
+    def scroll_to(self, offset:int):
+        """
+        Show the rows starting at this offset. Only the visible rows are rendered and fetched.
+
+        :param offset: The index of the first visible row
+        :type offset: int
+        """
+        self.offset = max(0, min(int(offset), len(self.ids) - self.rows))
+        self._render()
+
+    def _yview(self, *args):
+        if args[0] == 'moveto': self.scroll_to(round(float(args[1]) * len(self.ids)))
+        elif args[0] == 'scroll': self.scroll_to(self.offset + int(args[1]) * (self.rows if args[2] == 'pages' else 1))
+
+    def _listed(self, res:dict[str, str]):
+        self._listing = False
+        self.names = res
+        self.ids = list(res.keys())
+        self._count_lbl.configure(text=f'{len(self.ids)} players')
+        self.scroll_to(self.offset)
+
+    def _failed(self, err:Exception):
+        self._listing = False
+        self.app.set_status(f'Players: {err}')
+
+    def _render(self):
+        visible = self.ids[self.offset:self.offset + self.rows]
+        for i in range(self.rows):
+            if i >= len(visible):
+                self._tree.item(str(i), text='', values=())
+                continue
+            id = visible[i]
+            player = self._details.get(id)
+            if player is None:
+                self._tree.item(str(i), text=self.names[id], values=('...',))
+            else:
+                self._details.move_to_end(id)
+                self._tree.item(str(i), text=player.name, values=(player.status.value, player.op, player.banned, player.lastseen))
+        total = max(1, len(self.ids))
+        self._scroll.set(self.offset / total, min(1.0, (self.offset + self.rows) / total))
+        self._fetch([x for x in visible if x not in self._details and x not in self._fetching])
+
+    def _fetch(self, ids:list[str]):
+        for id in ids:
+            self._fetching.add(id)
+            self.app.worker.submit(self._load, id, callback=lambda res, id=id: self._fetched(id, res), errback=lambda err, id=id: self._fetching.discard(id))
+
+    def _load(self, id:str):
+        # Runs on a worker thread, rows that were scrolled away before their turn are skipped
+        if id not in self.ids[self.offset:self.offset + self.rows]: return None
+        return self.api.get_player(id)
+
+    def _fetched(self, id:str, player):
+        self._fetching.discard(id)
+        if player is None: return
+        self._details[id] = player
+        while len(self._details) > self.cache_size: self._details.popitem(last=False)
+        if id in self.ids[self.offset:self.offset + self.rows]: self._render()
 
 @page
 class BackupManagerPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Backup Manager')
+    name = 'Backup Manager'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 @page
 class CommandsPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Commands')
+    name = 'Commands'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 @page
 class ScheduledTasksPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Scheduled Tasks')
+    name = 'Scheduled Tasks'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 @page
 class UsersPage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'Users')
+    name = 'Users'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 @page
 class DatabasePage(Page):
-    def __init__(self, frame, api):
-        super().__init__(frame, api, 'MySQL Database')
+    name = 'MySQL Database'
+
+    def __init__(self, frame, app):
+        super().__init__(frame, app)
         Label(frame, text=self.name).grid(row=0, column=0, sticky='nw')
 
 # App
@@ -100,36 +383,67 @@ class MulticraftApp(Tk, MulticraftAPI):
         self.geometry('700x600')
 
         self.pages = []
+        self.current = None
+        self._refresh_id = None
+
+        self.worker = Worker(self)
 
         # Widgets
         self._pages = Listbox(self)
         self._pages.grid(row=0, column=0, sticky='nsw')
         self._pages.bind('<<ListboxSelect>>', self._listbox_select)
+        self._status_lbl = Label(self, anchor='w')
+        self._status_lbl.grid(row=1, column=0, columnspan=2, sticky='ew')
 
         # Responsive
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=1)
 
+    def set_status(self, text:str):
+        pending = self.worker.pending
+        self._status_lbl.configure(text=text if pending == 0 else f'{text} ({pending} pending)')
+
+    def destroy(self):
+        if self._refresh_id is not None: self.after_cancel(self._refresh_id)
+        self.worker.stop()
+        super().destroy()
+
     def _listbox_select(self, e:Event):
         cur = self._pages.curselection()
         if len(cur) == 0: return
         self.page(cur[0])
 
     def page(self, page_id:int):
-        for page in self.pages: page.frame.forget()
+        """
+        Show this page. Pages are built the first time they are shown and only the visible page refreshes.
+
+        :param page_id: The index of the page
+        :type page_id: int
+        """
+        global pages
+        if self.current is not None: self.current.frame.grid_forget()
         p = self.pages[page_id]
+        if p is None:
+            frame = Frame(self)
+            frame.grid_rowconfigure(1, weight=1)
+            frame.grid_columnconfigure(0, weight=1)
+            p = self.pages[page_id] = pages[page_id](frame, self)
         p.frame.grid(row=0, column=1, sticky='nesw')
+        self.current = p
+        if self._refresh_id is not None: self.after_cancel(self._refresh_id)
+        self._refresh()
+
+    def _refresh(self):
+        self.current.refresh()
+        self._refresh_id = self.after(self.current.interval, self._refresh)
 
     def mainloop(self):
         global pages
         for p in pages:
-            frame = Frame(self)
-            frame.grid_rowconfigure(1, weight=1)
-            frame.grid_columnconfigure(0, weight=1)
-            page = p(frame, self.api)
-            self._pages.insert('end', page.name)
-            self.pages.append(page)
+            self._pages.insert('end', p.name)
+            self.pages.append(None)
         self.page(0)
+        self.worker.start()
         super().mainloop()
 
 
@@ -0,0 +1,140 @@
+"""
+Circuit breaker and health score for each panel endpoint
+"""
+import threading
+import time
+
+from . import MulticraftCircuitOpen
+
+__all__ = ['CircuitBreaker']
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+class CircuitBreaker:
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half_open'
+
+    def __init__(self, name:str='', failure_threshold:int=5, latency_threshold:float=None, reset_timeout:float=30.0, half_open_max:int=2, decay:float=0.2):
+        """
+        Fail fast while an endpoint is down. The circuit opens after failure_threshold consecutive failures, after reset_timeout seconds a few probe calls are let through (half open) and it closes again once they all succeed.
+
+        :param name: The name of the endpoint, usually its url, defaults to ''
+        :type name: str, optional
+        :param failure_threshold: The number of consecutive failures that open the circuit, defaults to 5
+        :type failure_threshold: int, optional
+        :param latency_threshold: Calls slower than this many seconds count as failures, defaults to None
+        :type latency_threshold: float, optional
+        :param reset_timeout: Seconds the circuit stays open before probing, defaults to 30.0
+        :type reset_timeout: float, optional
+        :param half_open_max: The number of probe calls let through while half open, defaults to 2
+        :type half_open_max: int, optional
+        :param decay: How quickly the health score follows new results, between 0 and 1, defaults to 0.2
+        :type decay: float, optional
+        """
+        self.name = str(name)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = float(reset_timeout)
+        self.half_open_max = max(1, int(half_open_max))
+        self.decay = float(decay)
+        self.failures = 0
+        self.latency = 0.0
+        self._state = CircuitBreaker.closed
+        self._opened = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._success_rate = 1.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"CircuitBreaker(name='{self.name}', state='{self.state}', health={self.health:.2f})"
+
+    @classmethod
+    def for_url(cls, url:str, **kw):
+        """
+        Get the shared breaker for this endpoint, every client of the same url uses the same breaker
+
+        :param url: The API url
+        :type url: str
+        :return: The breaker
+        :rtype: CircuitBreaker
+        """
+        with _breakers_lock:
+            if url not in _breakers: _breakers[url] = cls(url, **kw)
+            return _breakers[url]
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == CircuitBreaker.open and time.monotonic() - self._opened >= self.reset_timeout: return CircuitBreaker.half_open
+            return self._state
+
+    @property
+    def health(self) -> float:
+        """
+        The health of this endpoint between 0 (down) and 1 (healthy), based on recent successes and latency
+        """
+        state = self.state
+        if state == CircuitBreaker.open: return 0.0
+        score = self._success_rate
+        if self.latency_threshold: score *= max(0.0, 1.0 - self.latency / (2 * self.latency_threshold))
+        return score * (0.5 if state == CircuitBreaker.half_open else 1.0)
+
+    def allow(self):
+        """
+        Check that a call may be made
+
+        :raises MulticraftCircuitOpen: If the circuit is open, or half open and all probes are in flight
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.open:
+                if time.monotonic() - self._opened < self.reset_timeout: raise MulticraftCircuitOpen(f"Circuit for '{self.name}' is open")
+                self._state = CircuitBreaker.half_open
+                self._probes = 0
+                self._probe_successes = 0
+            if self._state == CircuitBreaker.half_open:
+                if self._probes >= self.half_open_max: raise MulticraftCircuitOpen(f"Circuit for '{self.name}' is half open, waiting for probes")
+                self._probes += 1
+
+    def record(self, success:bool, latency:float=0.0):
+        """
+        Record the result of a call
+
+        :param success: Whether the endpoint answered
+        :type success: bool
+        :param latency: The seconds the call took, defaults to 0.0
+        :type latency: float, optional
+        """
+        if success and self.latency_threshold is not None and latency > self.latency_threshold: success = False
+        with self._lock:
+            self.latency += self.decay * (latency - self.latency)
+            self._success_rate += self.decay * ((1.0 if success else 0.0) - self._success_rate)
+            if self._state == CircuitBreaker.half_open:
+                if not success: return self._trip()
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_max:
+                    self._state = CircuitBreaker.closed
+                    self.failures = 0
+                return
+            if success:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold: self._trip()
+
+    def _trip(self):
+        self._state = CircuitBreaker.open
+        self._opened = time.monotonic()
+        self.failures = 0
+
+    def reset(self):
+        """
+        Close the circuit and forget recent results
+        """
+        with self._lock:
+            self._state = CircuitBreaker.closed
+            self.failures = 0
+            self.latency = 0.0
+            self._success_rate = 1.0
@@ -0,0 +1,94 @@
+"""
+Command-line tool. Run "multicraft --help" for usage.
+
+Results are written as NDJSON, one line per server as soon as it finishes.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import json
+import os
+import sys
+
+from .model import to_json
+
+__all__ = ['main']
+
+COMMANDS = {
+    'status': lambda api, id, args: api.get_server_status(id, args.players),
+    'resources': lambda api, id, args: api.get_server_resources(id),
+    'log': lambda api, id, args: api.get_server_log(id)[-args.lines:],
+    'chat': lambda api, id, args: api.get_server_chat(id)[-args.lines:],
+    'start': lambda api, id, args: api.start_server(id),
+    'stop': lambda api, id, args: api.stop_server(id),
+    'restart': lambda api, id, args: api.restart_server(id),
+    'kill': lambda api, id, args: api.kill_server(id),
+    'backup': lambda api, id, args: api.start_server_backup(id),
+    'backup-status': lambda api, id, args: api.get_server_backup_status(id),
+    'players': lambda api, id, args: api.list_players(id),
+    'send': lambda api, id, args: api.send_console_command(id, ' '.join(args.command))
+}
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser('multicraft', description='Interact with servers on hosts that use Multicraft.')
+    parser.add_argument('--url', default=os.getenv('MULTICRAFT_URL'), help='The API url or a host name from hosts.py (for example BISECT_PANEL). Defaults to $MULTICRAFT_URL')
+    parser.add_argument('--user', default=os.getenv('MULTICRAFT_USER'), help='The username. Defaults to $MULTICRAFT_USER')
+    parser.add_argument('--key', default=None, help='The API key. Defaults to $KEY')
+    parser.add_argument('--concurrency', '-j', type=int, default=8, help='The maximum number of calls in flight. Defaults to 8')
+    sub = parser.add_subparsers(dest='action', required=True)
+    for name in COMMANDS.keys():
+        cmd = sub.add_parser(name)
+        cmd.add_argument('servers', nargs='*', type=int, help='The ids of the servers')
+        cmd.add_argument('--owner', action='append', default=[], help='Every server owned by this user id or name')
+        cmd.add_argument('--connection', action='append', type=int, default=[], help='Every server on this connection (daemon)')
+        cmd.add_argument('--all', action='store_true', help='Every server owned by the current user')
+        if name == 'status': cmd.add_argument('--players', action='store_true', help='Include the list of online players')
+        if name in ('log', 'chat'): cmd.add_argument('--lines', type=int, default=100, help='The number of lines. Defaults to 100')
+        if name == 'send': cmd.add_argument('--command', nargs='+', required=True, help='The console command to send')
+    return parser
+
+def _client(args):
+    from .api import MulticraftAPI
+    from . import hosts
+    if args.url is None or args.user is None: raise SystemExit('multicraft: --url and --user (or $MULTICRAFT_URL and $MULTICRAFT_USER) are required')
+    url = getattr(hosts, args.url.upper()) if args.url.upper() in hosts.__all__ else args.url
+    return MulticraftAPI(url, args.user, args.key)
+
+def _select(api, args) -> list[int]:
+    ids = list(args.servers)
+    owners = list(args.owner)
+    if args.all: owners.append(api.user)
+    owners = [int(x) if str(x).isdigit() else x for x in owners]
+    names = [x for x in owners if isinstance(x, str)]
+    owners = [x for x in owners if isinstance(x, int)] + api.bulk('get_user_id', names, args.concurrency)
+    for res in api.bulk('list_servers_by_owner', owners, args.concurrency) + api.bulk('list_servers_by_connection', args.connection, args.concurrency):
+        ids.extend(int(x) for x in res.keys())
+    return list(dict.fromkeys(ids))
+
+def main(argv:list[str]=None) -> int:
+    """
+    Run the command-line tool
+
+    :param argv: The arguments, defaults to sys.argv[1:]
+    :type argv: list[str], optional
+    :return: The exit code. 1 if any server failed
+    :rtype: int
+    """
+    args = _parser().parse_args(argv)
+    api = _client(args)
+    ids = _select(api, args)
+    if len(ids) == 0: raise SystemExit('multicraft: no servers selected')
+    fn = COMMANDS[args.action]
+    failed = 0
+    with ThreadPoolExecutor(max(1, args.concurrency)) as pool:
+        futures = {pool.submit(fn, api, x, args): x for x in ids}
+        for future in as_completed(futures):
+            try: line = {'server_id': futures[future], 'ok': True, 'result': to_json(future.result())}
+            except Exception as err:
+                failed += 1
+                line = {'server_id': futures[future], 'ok': False, 'error': str(err), 'type': err.__class__.__name__}
+            sys.stdout.write(json.dumps(line) + '\n')
+            sys.stdout.flush()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+Compact binary format for models
+
+Models are written in blocks of consecutive models of the same type. A block is a type byte and a count, then one column per field: fixed size fields are packed with a single struct call, strings are joined into one utf-8 blob after their lengths. Reading a block takes one unpack_from per column, not per model. Enums are stored as the small ints in the tables below, never by member position, and datetimes as epoch seconds.
+"""
+from collections import deque
+from itertools import accumulate, groupby, repeat
+from operator import itemgetter, methodcaller
+from enum import Enum
+from typing import Iterator
+import datetime
+import struct
+
+from . import MulticraftException
+from .model import Status, ScheduleStatus, BackupStatus, User, Server, Command, ServerStatus, ServerResources, ChatMessage, Player, Schedule, Database, Backup
+
+__all__ = ['Layout', 'pack_model', 'pack_models', 'unpack_model', 'iter_unpack_models']
+
+_NONE_TIME = -2 ** 63
+_NONE_ENUM = 255
+_HEADER = struct.Struct('<BI')
+# Kind of column (_PLAIN or _INDEXED), width of the lengths or indexes, number of None values, size of the blob or number of distinct values
+_STRINGS = struct.Struct('<BcII')
+_PLAIN = 0
+_INDEXED = 1
+_WIDTHS = ((0xFF, b'B'), (0xFFFF, b'H'), (0xFFFFFFFF, b'I'))
+
+# Fixed size kinds and their struct codes, 's' (str) and 'l' (list[str]) are variable
+_CODES = {'i': 'i', 'f': 'd', '?': '?', 't': 'q', 'e': 'B'}
+
+# The wire value of each enum member. These are part of the format, a code must never be reused or changed, new members get new codes
+STATUS_CODES = {Status.online: 0, Status.offline: 1}
+SCHEDULE_STATUS_CODES = {x: x.value for x in ScheduleStatus}
+BACKUP_STATUS_CODES = {BackupStatus.done: 0}
+
+def _width(top:int) -> bytes:
+    return next(code for limit, code in _WIDTHS if top <= limit)
+
+def _pack_plain(column:list, out:bytearray):
+    nones = [i for i, x in enumerate(column) if x is None] if None in column else []
+    try: text = ''.join(column)
+    except TypeError:
+        column = ['' if x is None else str(x) for x in column]
+        text = ''.join(column)
+    lengths = list(map(len, column))
+    data = text.encode('utf-8')
+    width = _width(max(lengths, default=0))
+    out += _STRINGS.pack(_PLAIN, width, len(nones), len(data))
+    out += struct.pack(f"<{len(lengths)}{width.decode()}", *lengths)
+    if len(nones) > 0: out += struct.pack(f"<{len(nones)}I", *nones)
+    out += data
+
+def _pack_strings(column:list, out:bytearray):
+    distinct = dict.fromkeys(column)
+    if len(distinct) * 2 > len(column): return _pack_plain(column, out)
+    # Repeated values (quit reasons, hosts, daemons) are written once and referenced by index
+    index = {x: i for i, x in enumerate(distinct)}
+    width = _width(len(distinct))
+    out += _STRINGS.pack(_INDEXED, width, 0, len(distinct))
+    out += struct.pack(f"<{len(column)}{width.decode()}", *map(index.__getitem__, column))
+    _pack_plain(list(distinct), out)
+
+def _unpack_strings(buffer:memoryview, offset:int, count:int) -> tuple[list, int]:
+    kind, width, nones, size = _STRINGS.unpack_from(buffer, offset)
+    offset += _STRINGS.size
+    code = f"<{count}{width.decode()}"
+    values = struct.unpack_from(code, buffer, offset)
+    offset += struct.calcsize(code)
+    if kind == _INDEXED:
+        distinct, offset = _unpack_strings(buffer, offset, size)
+        return list(map(distinct.__getitem__, values)), offset
+    nones = struct.unpack_from(f"<{nones}I", buffer, offset) if nones > 0 else ()
+    offset += 4 * len(nones)
+    text = str(buffer[offset:offset + size], 'utf-8')
+    offset += size
+    # Lengths are in characters, so the blob is decoded once and sliced
+    ends = list(accumulate(values))
+    column = list(map(text.__getitem__, map(slice, [0, *ends], ends)))
+    for i in nones: column[i] = None
+    return column, offset
+
+def _split(items:list, counts:tuple) -> list[list]:
+    ends = list(accumulate(counts))
+    return list(map(items.__getitem__, map(slice, [0, *ends], ends)))
+
+class Layout:
+    def __init__(self, cls:type, tag:int, fields:list[tuple]):
+        """
+        The binary layout of a model. Each field is written as a column, so a block of models is read with one unpack_from per field.
+
+        :param cls: The model
+        :type cls: type
+        :param tag: The type byte written before each block, unique per model
+        :type tag: int
+        :param fields: The fields (NAME, KIND) or (NAME, 'e', CODES) where CODES maps each enum member to its wire value. KIND is 'i' int, 'f' float, '?' bool, 't' datetime, 'e' enum, 's' str or 'l' list[str]. The value is stored in the attribute "_NAME"
+        :type fields: list[tuple]
+        """
+        self.cls = cls
+        self.tag = int(tag)
+        self.fields = [x[0] for x in fields]
+        self.kinds = [x[1] for x in fields]
+        self._codes = {x[0]: dict(x[2]) for x in fields if x[1] == 'e'}
+        for name, codes in self._codes.items():
+            if len(set(codes.values())) != len(codes) or not all(0 <= x < _NONE_ENUM for x in codes.values()):
+                raise MulticraftException(f"Enum codes of {cls.__name__}.{name} must be unique and between 0 and {_NONE_ENUM - 1}")
+        # Raw values are accepted too, a getter may return its default before the enum is set
+        self._encode = {k: {None: _NONE_ENUM, **{e.value: x for e, x in v.items()}, **v} for k, v in self._codes.items()}
+        self._decode = {k: {_NONE_ENUM: None, **{x: e for e, x in v.items()}} for k, v in self._codes.items()}
+        self._storage = ['_run' if x == 'console_command' else f"_{x}" for x in self.fields]
+        # Every getter is getattr(self, STORAGE, DEFAULT), so columns are read from __dict__ with the same defaults
+        empty = cls.__new__(cls)
+        self._columns = [methodcaller('get', key, getattr(empty, name, None)) for name, key in zip(self.fields, self._storage)]
+        rows = itemgetter(*self._storage)
+        self._rows = rows if len(self._storage) > 1 else lambda attrs: (rows(attrs),)
+        # Enum members hash in Python, looking them up by identity is much cheaper
+        self._encode_ids = {k: {id(x): code for x, code in v.items() if x is None or isinstance(x, Enum)} for k, v in self._encode.items()}
+
+    def __repr__(self):
+        return f"Layout(cls={self.cls.__name__}, tag={self.tag}, fields={len(self.fields)})"
+
+    def pack(self, objs:list, out:bytearray):
+        count = len(objs)
+        out += _HEADER.pack(self.tag, count)
+        if type(objs[0]) is not self.cls:
+            # Lazy models only have their id and name until loaded
+            for obj in objs:
+                if hasattr(obj, 'load'): obj.load()
+        attrs = list(map(vars, objs))
+        try: columns = list(zip(*map(self._rows, attrs)))
+        except KeyError:
+            # Some models leave fields unset, those read the getter's default
+            columns = [list(map(get, attrs)) for get in self._columns]
+        for name, kind, column in zip(self.fields, self.kinds, columns):
+            if kind == 's':
+                _pack_strings(column, out)
+                continue
+            if kind == 'l':
+                column = [x or () for x in column]
+                out += struct.pack(f"<{count}I", *map(len, column))
+                _pack_strings([x for items in column for x in items], out)
+                continue
+            if kind == 't':
+                table = {x: int(x.timestamp()) if isinstance(x, datetime.datetime) else _NONE_TIME for x in set(column)}
+                column = list(map(table.__getitem__, column))
+            elif kind == 'e':
+                try: column = list(map(self._encode_ids[name].__getitem__, map(id, column)))
+                except KeyError:
+                    try: column = list(map(self._encode[name].__getitem__, column))
+                    except KeyError as err: raise MulticraftException(f"No code for {err.args[0]!r} in {self.cls.__name__}.{name}") from None
+            elif None in column: column = [0 if x is None else x for x in column]
+            out += struct.pack(f"<{count}{_CODES[kind]}", *column)
+
+    def unpack(self, buffer:memoryview, offset:int) -> tuple[list, int]:
+        _, count = _HEADER.unpack_from(buffer, offset)
+        offset += _HEADER.size
+        objs = list(map(self.cls.__new__, repeat(self.cls, count)))
+        for name, kind, key in zip(self.fields, self.kinds, self._storage):
+            if kind == 's': column, offset = _unpack_strings(buffer, offset, count)
+            elif kind == 'l':
+                counts = struct.unpack_from(f"<{count}I", buffer, offset)
+                items, offset = _unpack_strings(buffer, offset + 4 * count, sum(counts))
+                column = _split(items, counts)
+            else:
+                code = f"<{count}{_CODES[kind]}"
+                column = struct.unpack_from(code, buffer, offset)
+                offset += struct.calcsize(code)
+                if kind == 't':
+                    # Models of one block often share a time, each is converted once
+                    table = {x: None if x == _NONE_TIME else datetime.datetime.fromtimestamp(x) for x in set(column)}
+                    column = list(map(table.__getitem__, column))
+                elif kind == 'e':
+                    try: column = list(map(self._decode[name].__getitem__, column))
+                    except KeyError as err: raise MulticraftException(f"Unknown {self.cls.__name__}.{name} code {err.args[0]}") from None
+                if kind in ('t', 'e') and None in column:
+                    # Missing times and enums are left unset, so the getter returns its default
+                    rows = [(obj, x) for obj, x in zip(objs, column) if x is not None]
+                    if rows: deque(map(setattr, (x[0] for x in rows), repeat(key), (x[1] for x in rows)), 0)
+                    continue
+            # One column at a time, setattr on a plain attribute never reaches the property setters
+            deque(map(setattr, objs, repeat(key), column), 0)
+        return objs, offset
+
+LAYOUTS = [
+    Layout(User, 1, [('id', 'i'), ('name', 's'), ('email', 's'), ('global_role', 's'), ('lang', 's'), ('theme', 's'), ('gauth_secret', 's'), ('gauth_token', 's'), ('timezone', 's')]),
+    Layout(Server, 2, [('id', 'i'), ('port', 'i'), ('players', 'i'), ('memory', 'i'), ('name', 's'), ('daemon_id', 's'), ('ip', 's')]),
+    Layout(Command, 3, [('id', 'i'), ('server_id', 'i'), ('level', 'i'), ('prereq', 'i'), ('hidden', '?'), ('name', 's'), ('chat', 's'), ('response', 's'), ('console_command', 's')]),
+    Layout(ServerStatus, 4, [('status', 'e', STATUS_CODES), ('online_players', 'i'), ('max_players', 'i'), ('players', 'l')]),
+    Layout(ServerResources, 5, [('cpu', 'f'), ('memory', 'f'), ('quota', 'i')]),
+    Layout(ChatMessage, 6, [('time', 't'), ('text', 's'), ('name', 's')]),
+    Layout(Player, 7, [('id', 'i'), ('server_id', 'i'), ('level', 'i'), ('lastseen', 't'), ('banned', '?'), ('op', '?'), ('status', 'e', STATUS_CODES), ('name', 's'), ('ip', 's'), ('previps', 's'), ('quitreason', 's')]),
+    Layout(Schedule, 8, [('id', 'i'), ('server_id', 'i'), ('scheduled_ts', 't'), ('last_run_ts', 't'), ('interval', 'i'), ('command', 'i'), ('run_for', 'i'), ('status', 'e', SCHEDULE_STATUS_CODES), ('hidden', '?'), ('name', 's'), ('args', 's')]),
+    Layout(Database, 9, [('server_id', 'i'), ('host', 's'), ('name', 's'), ('username', 's'), ('password', 's'), ('link', 's')]),
+    Layout(Backup, 10, [('status', 'e', BACKUP_STATUS_CODES), ('time', 't'), ('ftp', 's'), ('message', 's'), ('file', 's')])
+]
+_BY_CLASS = {x.cls: x for x in LAYOUTS}
+_BY_TAG = {x.tag: x for x in LAYOUTS}
+
+def _layout_of(cls:type) -> Layout:
+    for base in cls.__mro__:
+        if base in _BY_CLASS: return _BY_CLASS[base]
+    raise MulticraftException(f"No binary layout for '{cls.__name__}'")
+
+def _unpack_block(view:memoryview, offset:int, api=None) -> tuple[list, int]:
+    layout = _BY_TAG.get(view[offset])
+    if layout is None: raise MulticraftException(f"Unknown record type {view[offset]} at offset {offset}")
+    try: objs, offset = layout.unpack(view, offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as err: raise MulticraftException(f"Truncated or corrupt {layout.cls.__name__} block at offset {offset}: {err}") from None
+    if api is not None and hasattr(layout.cls, 'bind'):
+        for obj in objs: obj.bind(api)
+    return objs, offset
+
+def pack_model(obj, out:bytearray=None) -> bytearray:
+    """
+    Encode a model. Lazy models are loaded first.
+
+    :param obj: The model
+    :type obj: Player|ChatMessage|ServerStatus|ServerResources|Server|Command|Schedule|Database|Backup|User
+    :param out: The buffer to append to, defaults to a new bytearray
+    :type out: bytearray, optional
+    :return: The buffer
+    :rtype: bytearray
+    """
+    if out is None: out = bytearray()
+    _layout_of(type(obj)).pack([obj], out)
+    return out
+
+def pack_models(objs, out:bytearray=None) -> bytearray:
+    """
+    Encode many models into the same buffer. Consecutive models of the same type share one block, so a list of one type is the most compact and the fastest to read.
+
+    :param objs: The models, they may be of different types
+    :type objs: Iterable
+    :param out: The buffer to append to, defaults to a new bytearray
+    :type out: bytearray, optional
+    :return: The buffer
+    :rtype: bytearray
+    """
+    if out is None: out = bytearray()
+    for cls, group in groupby(objs, type): _layout_of(cls).pack(list(group), out)
+    return out
+
+def unpack_model(buffer, offset:int=0, api=None) -> tuple[object, int]:
+    """
+    Decode one model written by pack_model. The buffer is read in place, it is not copied.
+
+    :param buffer: Any object that supports the buffer protocol (bytes, bytearray, memoryview, mmap)
+    :type buffer: bytes|bytearray|memoryview
+    :param offset: Where the record starts, defaults to 0
+    :type offset: int, optional
+    :param api: Bind decoded models to this client, defaults to None
+    :type api: MulticraftAPI, optional
+    :raises MulticraftException: If the block holds more than one model, read those with iter_unpack_models
+    :return: The model and the offset of the next record
+    :rtype: tuple[object, int]
+    """
+    view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+    objs, end = _unpack_block(view, offset, api)
+    if len(objs) != 1: raise MulticraftException(f"The block at offset {offset} holds {len(objs)} models, read it with iter_unpack_models")
+    return objs[0], end
+
+def iter_unpack_models(buffer, api=None) -> Iterator:
+    """
+    Decode every model in a buffer written by pack_model or pack_models
+
+    :param buffer: Any object that supports the buffer protocol (bytes, bytearray, memoryview, mmap)
+    :type buffer: bytes|bytearray|memoryview
+    :param api: Bind decoded models to this client, defaults to None
+    :type api: MulticraftAPI, optional
+    :return: The models in order
+    :rtype: Iterator
+    """
+    view = buffer if isinstance(buffer, memoryview) else memoryview(buffer)
+    offset = 0
+    while offset < len(view):
+        objs, offset = _unpack_block(view, offset, api)
+        yield from objs
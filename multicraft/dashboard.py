@@ -0,0 +1,220 @@
+"""
+Headless dashboard that polls the panel once for each server and serves the result to many local clients
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import json
+import time
+
+from .logs import LogTail
+
+__all__ = ['Dashboard']
+
+class Dashboard:
+    def __init__(self, api, server_ids:list[int], interval:float=5.0, log_lines:int=100, chat_lines:int=50, max_workers:int=8):
+        """
+        Create a new dashboard. The panel is polled once per interval no matter how many clients are connected.
+
+        Endpoints:
+        - GET /servers: The state of every server as JSON
+        - GET /servers/<id>: The state of one server as JSON
+        - GET /events: Server-sent events, one "update" event with every server's state after each poll
+
+        :param api: The client to poll with
+        :type api: MulticraftAPI
+        :param server_ids: The ids of the servers to poll
+        :type server_ids: list[int]
+        :param interval: Seconds between polls, defaults to 5.0
+        :type interval: float, optional
+        :param log_lines: The number of log lines to keep for each server, defaults to 100
+        :type log_lines: int, optional
+        :param chat_lines: The number of chat messages to keep for each server, defaults to 50
+        :type chat_lines: int, optional
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        """
+        self.api = api
+        self.server_ids = [int(x) for x in server_ids]
+        self.interval = float(interval)
+        self.log_lines = int(log_lines)
+        self.chat_lines = int(chat_lines)
+        self.max_workers = int(max_workers)
+        self.version = 0
+        self._state = {x: {'id': x} for x in self.server_ids}
+        self._tails = {x: LogTail(api, x) for x in self.server_ids}
+        self._payload = json.dumps(self.state()).encode()
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._poller = None
+        self._httpd = None
+
+    def __repr__(self):
+        return f"Dashboard(servers={len(self.server_ids)}, version={self.version})"
+
+    # Polling
+
+    def _poll_server(self, server_id:int) -> dict:
+        state = dict(self._state[server_id])
+        try:
+            status = self.api.get_server_status(server_id, True)
+            resources = self.api.get_server_resources(server_id)
+            chat = self.api.get_server_chat(server_id)
+            lines = self._tails[server_id].poll()
+        except Exception as err:
+            state['error'] = str(err)
+            return state
+        state.pop('error', None)
+        state['status'] = status.status.value
+        state['online_players'] = status.online_players
+        state['max_players'] = status.max_players
+        state['players'] = status.players
+        state['cpu'] = resources.cpu
+        state['memory'] = resources.memory
+        state['quota'] = resources.quota
+        state['chat'] = [{'name': x.name, 'text': x.text, 'time': x.time.timestamp()} for x in chat[-self.chat_lines:]]
+        state['log'] = (state.get('log', []) + lines)[-self.log_lines:]
+        state['updated'] = time.time()
+        return state
+
+    def poll(self) -> dict[int, dict]:
+        """
+        Poll every server once and notify connected clients
+
+        :return: The state of every server
+        :rtype: dict[int, dict]
+        """
+        res = self.api.bulk(self._poll_server, self.server_ids, max_workers=self.max_workers)
+        with self._changed:
+            self._state = dict(zip(self.server_ids, res))
+            self._payload = json.dumps(self.state()).encode()
+            self.version += 1
+            self._changed.notify_all()
+        return self._state
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self.interval)
+
+    # State
+
+    def state(self, server_id:int=None) -> dict:
+        """
+        Get the latest state without calling the panel
+
+        :param server_id: The id of one server, defaults to every server
+        :type server_id: int, optional
+        :return: The state
+        :rtype: dict
+        """
+        if server_id is None: return {str(k): v for k, v in self._state.items()}
+        return self._state[int(server_id)]
+
+    def payload(self) -> bytes:
+        """
+        Get the latest state of every server as encoded JSON. It is only encoded once per poll, however many clients read it.
+
+        :return: The JSON payload
+        :rtype: bytes
+        """
+        return self._payload
+
+    def wait(self, version:int, timeout:float=None) -> int:
+        """
+        Wait until the state is newer than this version
+
+        :param version: The last version the caller has seen
+        :type version: int
+        :param timeout: The maximum seconds to wait, defaults to None
+        :type timeout: float, optional
+        :return: The current version
+        :rtype: int
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version or self._stop.is_set(), timeout)
+            return self.version
+
+    # Server
+
+    def start(self, host:str='127.0.0.1', port:int=8080):
+        """
+        Start polling and serving in background threads
+
+        :param host: The address to listen on, defaults to '127.0.0.1'
+        :type host: str, optional
+        :param port: The port to listen on, defaults to 8080
+        :type port: int, optional
+        :return: This dashboard
+        :rtype: Dashboard
+        """
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._run, name='multicraft-dashboard', daemon=True)
+        self._poller.start()
+        self._httpd = ThreadingHTTPServer((host, int(port)), _handler(self))
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name='multicraft-http', daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop polling and serving
+        """
+        self._stop.set()
+        with self._changed: self._changed.notify_all()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def serve_forever(self, host:str='127.0.0.1', port:int=8080):
+        """
+        Start the dashboard and block until interrupted
+
+        :param host: The address to listen on, defaults to '127.0.0.1'
+        :type host: str, optional
+        :param port: The port to listen on, defaults to 8080
+        :type port: int, optional
+        """
+        self.start(host, port)
+        try: self._stop.wait()
+        except KeyboardInterrupt: pass
+        finally: self.stop()
+
+def _handler(dashboard:Dashboard):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args): pass
+
+        def _json(self, code:int, data):
+            body = data if isinstance(data, bytes) else json.dumps(data).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?')[0].rstrip('/')
+            if path == '/servers': return self._json(200, dashboard.payload())
+            if path.startswith('/servers/'):
+                try: return self._json(200, dashboard.state(int(path[9:])))
+                except (KeyError, ValueError): return self._json(404, {'error': 'Unknown server'})
+            if path == '/events': return self._events()
+            self._json(404, {'error': 'Not found'})
+
+        def _events(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            version = -1
+            try:
+                while not dashboard._stop.is_set():
+                    current = dashboard.wait(version, 15)
+                    if current == version:
+                        self.wfile.write(b': keep-alive\n\n')
+                    else:
+                        version = current
+                        self.wfile.write(f'id: {version}\nevent: update\ndata: '.encode() + dashboard.payload() + b'\n\n')
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError): pass
+    return Handler
@@ -0,0 +1,307 @@
+"""
+Database credential cache with single-flight refresh and coordinated password rotation
+"""
+from concurrent.futures import Future
+import dbm
+import logging
+import os
+import shelve
+import threading
+import time
+import uuid
+
+from .model import Database
+from .snapshot import DatabaseSnapshot, freeze
+
+__all__ = ['DatabaseCache', 'FileLease']
+
+log = logging.getLogger(__name__)
+
+class FileLease:
+    def __init__(self, directory:str, ttl:float=60.0):
+        """
+        Leases shared by every process that uses the same directory. A lease is a file created with O_EXCL, so exactly one process gets it. Any object with the same acquire(key) and release(key) methods can be used instead, e.g. SET key token NX PX on Redis.
+
+        :param directory: The directory to keep the lease files in, created if missing
+        :type directory: str
+        :param ttl: The seconds after which a lease that was never released (its process died) is taken over. It must be longer than the slowest panel call, defaults to 60.0
+        :type ttl: float, optional
+        """
+        self.directory = directory
+        self.ttl = float(ttl)
+        self._tokens: dict[str, str] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"FileLease(directory={self.directory!r}, ttl={self.ttl})"
+
+    def _path(self, key:str) -> str:
+        return os.path.join(self.directory, f"{key}.lease")
+
+    def acquire(self, key:str) -> bool:
+        """
+        Take a lease without waiting
+
+        :param key: The name of the lease
+        :type key: str
+        :return: False if another process or thread holds it
+        :rtype: bool
+        """
+        path = self._path(key)
+        token = uuid.uuid4().hex
+        try: fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < self.ttl: return False
+                # Move the expired lease aside first, only one process can, then check it is still the expired one
+                aside = f"{path}.{token}"
+                os.rename(path, aside)
+                if time.time() - os.path.getmtime(aside) < self.ttl:
+                    try: os.link(aside, path)
+                    except FileExistsError: pass
+                    os.remove(aside)
+                    return False
+                os.remove(aside)
+            except FileNotFoundError: pass
+            return self.acquire(key)
+        with os.fdopen(fd, 'w') as file: file.write(token)
+        with self._lock: self._tokens[key] = token
+        return True
+
+    def release(self, key:str):
+        """
+        Give back a lease taken by acquire. A lease that expired and was taken over is left alone.
+
+        :param key: The name of the lease
+        :type key: str
+        """
+        with self._lock: token = self._tokens.pop(key, None)
+        if token is None: return
+        path = self._path(key)
+        try:
+            with open(path) as file:
+                if file.read() == token: os.remove(path)
+        except FileNotFoundError: pass
+
+class DatabaseCache:
+    def __init__(self, api, ttl:float=300.0, store=None, lease=None, poll:float=0.05):
+        """
+        Create a new credential cache. However many threads ask for the same server at once, the panel only sees one call, and credentials are returned as immutable DatabaseSnapshots that can be shared freely.
+
+        cache = DatabaseCache(api, ttl=600)
+        db = cache.get(1234)
+        cache.subscribe(lambda server_id, old, new: pool.reconnect(new))
+        cache.rotate(1234)
+
+        Single-flight only covers the threads of one process unless a lease and a store shared by every process are given. Then a process that finds the lease taken waits for it and reads the result from the store instead of calling the panel, and a rotation another process finished meanwhile is returned instead of rotating again. Subscribers are only told about changes made in their own process.
+
+        cache = DatabaseCache(api, store=RedisDict(redis), lease=FileLease('/run/multicraft'))
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param ttl: The seconds credentials are trusted for, defaults to 300.0
+        :type ttl: float, optional
+        :param store: A file name for a shelve database, or any dict-like object, that keeps credentials across restarts. Passwords are written in plain text, a shelve file is created readable by its owner only. Shelve files must not be opened by two processes at once, share a store between processes with a mapping backed by a server, defaults to None
+        :type store: str|MutableMapping, optional
+        :param lease: Leases shared by every process, an object with acquire(key) -> bool and release(key) such as FileLease, defaults to None
+        :type lease: FileLease, optional
+        :param poll: The seconds between tries while another process holds a lease, defaults to 0.05
+        :type poll: float, optional
+        """
+        self.api = api
+        self.ttl = float(ttl)
+        self.store = self._open(store) if isinstance(store, str) else store
+        self.lease = lease
+        self.poll = float(poll)
+        self._entries: dict[int, tuple[float, DatabaseSnapshot]] = {}
+        self._flights: dict[int, tuple[str, Future]] = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        # Changes seen while this thread runs a flight, told once the flight is over
+        self._local = threading.local()
+        api.add_listener(self._on_call)
+
+    def __repr__(self):
+        return f"DatabaseCache(cached={len(self._entries)}, ttl={self.ttl})"
+
+    def close(self):
+        """
+        Stop listening to the client and close the store
+        """
+        self.api.remove_listener(self._on_call)
+        if hasattr(self.store, 'close'): self.store.close()
+
+    # Internal
+
+    @staticmethod
+    def _open(path:str):
+        # The credentials are plain text, other users must not read them. dbm applies the mode to every file it creates
+        return shelve.Shelf(dbm.open(path, 'c', 0o600))
+
+    def _entry(self, server_id:int) -> tuple[float, DatabaseSnapshot]|None:
+        # Other processes write to a shared store, it is read before this process' own copy
+        if self.lease is not None and self.store is not None:
+            entry = self.store.get(str(server_id))
+            if entry is not None: return entry
+        entry = self._entries.get(server_id)
+        if entry is None and self.store is not None: entry = self.store.get(str(server_id))
+        return entry
+
+    def _shared(self, kind:str, server_id:int, fn) -> DatabaseSnapshot:
+        # Runs fn while holding the lease of the server, or uses what the process that held it stored
+        key = f"database-{server_id}"
+        with self._lock: entry = self._entry(server_id)
+        before = None if entry is None else entry[1]
+        waited = False
+        while not self.lease.acquire(key):
+            waited = True
+            time.sleep(self.poll)
+        try:
+            if waited or kind == 'get':
+                with self._lock: entry = self._entry(server_id)
+                # A get is answered by the fetch it waited for, a rotation by one that finished meanwhile
+                if entry is not None and (kind == 'get' and entry[0] > time.time() or kind == 'rotate' and before is not None and entry[1] != before):
+                    self._put(server_id, entry[1], entry[0])
+                    return entry[1]
+            return fn()
+        finally: self.lease.release(key)
+
+    def _put(self, server_id:int, database:DatabaseSnapshot|None, expires:float=None):
+        with self._lock:
+            # What this process knew, a shared store may already hold the new credentials
+            entry = self._entries.get(server_id) or self._entry(server_id)
+            old = None if entry is None else entry[1]
+            if database is None:
+                self._entries.pop(server_id, None)
+                if self.store is not None: self.store.pop(str(server_id), None)
+            else:
+                entry = (time.time() + self.ttl if expires is None else expires, database)
+                self._entries[server_id] = entry
+                if self.store is not None: self.store[str(server_id)] = entry
+            subscribers = list(self._subscribers)
+        if old is None or old == database: return
+        changes = [(fn, server_id, old, database) for fn in subscribers]
+        pending = getattr(self._local, 'pending', None)
+        # A subscriber that calls get() would wait on the flight that is telling it
+        if pending is not None: pending += changes
+        else: self._notify(changes)
+
+    def _notify(self, changes:list[tuple]):
+        for fn, server_id, old, new in changes:
+            try: fn(server_id, old, new)
+            except Exception: log.exception(f"Subscriber {fn!r} failed for server {server_id}")
+
+    def _on_call(self, method:str, params:dict, result):
+        if method in ('getDatabaseInfo', 'createDatabase', 'changeDatabasePassword'):
+            # from_json pops keys, the client still needs the original
+            res = dict(result)
+            res['server_id'] = int(params['server_id'])
+            self._put(int(params['server_id']), freeze(Database.from_json(res)))
+        elif method == 'deleteDatabase':
+            self._put(int(params['server_id']), None)
+
+    def _flight(self, kind:str, server_id:int, fn) -> DatabaseSnapshot:
+        while True:
+            with self._lock:
+                flight = self._flights.get(server_id)
+                if flight is None:
+                    future = Future()
+                    self._flights[server_id] = (kind, future)
+                    break
+            if flight[0] == kind or kind == 'get': return flight[1].result()
+            # A rotation must not join a refresh that started before it
+            try: flight[1].result()
+            except Exception: pass
+        pending = self._local.pending = []
+        try:
+            res = fn() if self.lease is None else self._shared(kind, server_id, fn)
+            future.set_result(res)
+            return res
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            self._local.pending = None
+            with self._lock: self._flights.pop(server_id, None)
+            self._notify(pending)
+
+    # Credentials
+
+    def get(self, server_id:int) -> DatabaseSnapshot:
+        """
+        Get the credentials of a server's database. They are fetched when missing or older than ttl, waiting for any refresh or rotation already in flight.
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The credentials
+        :rtype: DatabaseSnapshot
+        """
+        server_id = int(server_id)
+        with self._lock:
+            entry = None if server_id in self._flights else self._entry(server_id)
+        if entry is not None and entry[0] > time.time(): return entry[1]
+        return self._flight('get', server_id, lambda: freeze(self.api.get_database_info(server_id)))
+
+    def refresh(self, server_id:int) -> DatabaseSnapshot:
+        """
+        Fetch the credentials of a server's database again
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The credentials
+        :rtype: DatabaseSnapshot
+        """
+        self.invalidate(server_id)
+        return self.get(server_id)
+
+    def invalidate(self, server_id:int):
+        """
+        Forget the credentials of a server's database without telling subscribers
+
+        :param server_id: The id of the server
+        :type server_id: int
+        """
+        with self._lock:
+            self._entries.pop(int(server_id), None)
+            if self.store is not None: self.store.pop(str(int(server_id)), None)
+
+    def rotate(self, server_id:int, database_id:int=None, password:str=None) -> DatabaseSnapshot:
+        """
+        Change the password of a server's database. Concurrent rotations of the same server share one call, get() waits until the new credentials are cached and subscribers are told about them before this returns.
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :param database_id: The id of the database, defaults to server_id if None
+        :type database_id: int, optional
+        :param password: The new password (Autogenerated for some hosts), defaults to None
+        :type password: str, optional
+        :return: The new credentials
+        :rtype: DatabaseSnapshot
+        """
+        server_id = int(server_id)
+        return self._flight('rotate', server_id, lambda: freeze(self.api.change_database_password(server_id, database_id, password)))
+
+    # Subscribers
+
+    def subscribe(self, fn):
+        """
+        Call fn(server_id, old, new) whenever cached credentials change. new is None if the database was deleted. It is called once the refresh or rotation that changed them is over, so it may use this cache.
+
+        :param fn: The function to call
+        :type fn: Callable[[int, DatabaseSnapshot, DatabaseSnapshot|None], None]
+        :return: The function, so it can be used as a decorator
+        :rtype: Callable
+        """
+        with self._lock: self._subscribers.append(fn)
+        return fn
+
+    def unsubscribe(self, fn):
+        """
+        Stop calling fn
+
+        :param fn: The function passed to subscribe
+        :type fn: Callable
+        """
+        with self._lock:
+            if fn in self._subscribers: self._subscribers.remove(fn)
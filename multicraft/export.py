@@ -0,0 +1,187 @@
+"""
+Stream players, chat and logs to NDJSON or CSV files, one row at a time
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+import csv
+import gzip
+import json
+import os
+
+from . import MulticraftException
+from .model import to_json
+
+__all__ = ['EXPORTS', 'RowWriter', 'iter_players', 'iter_chat', 'iter_log', 'export_server', 'export_many']
+
+def iter_players(api, server_id:int, batch_size:int=100, max_workers:int=8) -> Iterator[dict]:
+    """
+    Get every player of a server. Players are fetched batch_size at a time, so only one batch is held in memory.
+
+    :param api: The client to use
+    :type api: MulticraftAPI
+    :param server_id: The id of the server
+    :type server_id: int
+    :param batch_size: The number of players fetched concurrently, defaults to 100
+    :type batch_size: int, optional
+    :param max_workers: The maximum number of calls in flight, defaults to 8
+    :type max_workers: int, optional
+    :return: The rows
+    :rtype: Iterator[dict]
+    """
+    ids = [int(x) for x in api.list_players(server_id).keys()]
+    for i in range(0, len(ids), batch_size):
+        for player in api.bulk('get_player', ids[i:i + batch_size], max_workers):
+            yield to_json(player)
+
+def iter_chat(api, server_id:int, **kw) -> Iterator[dict]:
+    """
+    Get the chat of a server
+
+    :param api: The client to use
+    :type api: MulticraftAPI
+    :param server_id: The id of the server
+    :type server_id: int
+    :return: The rows
+    :rtype: Iterator[dict]
+    """
+    for message in api.get_server_chat(server_id):
+        yield {'time': to_json(message.time), 'name': message.name, 'text': message.text}
+
+def iter_log(api, server_id:int, **kw) -> Iterator[dict]:
+    """
+    Get the log of a server
+
+    :param api: The client to use
+    :type api: MulticraftAPI
+    :param server_id: The id of the server
+    :type server_id: int
+    :return: The rows
+    :rtype: Iterator[dict]
+    """
+    for index, line in enumerate(api.get_server_log(server_id)):
+        yield {'index': index, 'line': line}
+
+EXPORTS = {
+    'players': (iter_players, ['id', 'name', 'server_id', 'level', 'lastseen', 'banned', 'op', 'status', 'ip', 'previps', 'quitreason']),
+    'chat': (iter_chat, ['time', 'name', 'text']),
+    'log': (iter_log, ['index', 'line'])
+}
+
+class RowWriter:
+    def __init__(self, path:str, fields:list[str], format:str=None, compress:bool=None):
+        """
+        Write rows to a file as they arrive. The file is written next to path and moved into place on close, so a failed export never leaves a partial file.
+
+        :param path: The file to write
+        :type path: str
+        :param fields: The columns, in order
+        :type fields: list[str]
+        :param format: 'ndjson' or 'csv', defaults to the file extension
+        :type format: str, optional
+        :param compress: Gzip the file, defaults to True if path ends in .gz
+        :type compress: bool, optional
+        """
+        name = path[:-3] if path.endswith('.gz') else path
+        self.path = path
+        self.fields = list(fields)
+        self.format = format or ('csv' if name.endswith('.csv') else 'ndjson')
+        self.compress = path.endswith('.gz') if compress is None else compress
+        if self.format not in ('ndjson', 'csv'): raise MulticraftException(f"Unknown export format '{self.format}'")
+        self.rows = 0
+        self._tmp = f"{path}.part"
+        self._file = gzip.open(self._tmp, 'wt', encoding='utf-8', newline='') if self.compress else open(self._tmp, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self._file, self.fields, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def __repr__(self):
+        return f"RowWriter(path='{self.path}', format='{self.format}', rows={self.rows})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc_type is None)
+
+    def write(self, row:dict):
+        """
+        Write a row
+
+        :param row: The row
+        :type row: dict
+        """
+        if self._csv is not None: self._csv.writerow(row)
+        else: self._file.write(json.dumps({k: row.get(k) for k in self.fields}) + '\n')
+        self.rows += 1
+
+    def close(self, commit:bool=True):
+        """
+        Close the file
+
+        :param commit: Move the file into place, otherwise it is removed, defaults to True
+        :type commit: bool, optional
+        """
+        if self._file.closed: return
+        self._file.close()
+        if commit: os.replace(self._tmp, self.path)
+        else: os.remove(self._tmp)
+
+def export_server(api, kind:str, server_id:int, path:str, format:str=None, compress:bool=None, **kw) -> int:
+    """
+    Export the players, chat or log of a server
+
+    export_server(api, 'chat', 1234, 'chat-1234.csv.gz')
+
+    :param api: The client to use
+    :type api: MulticraftAPI
+    :param kind: 'players', 'chat' or 'log'
+    :type kind: str
+    :param server_id: The id of the server
+    :type server_id: int
+    :param path: The file to write
+    :type path: str
+    :param format: 'ndjson' or 'csv', defaults to the file extension
+    :type format: str, optional
+    :param compress: Gzip the file, defaults to True if path ends in .gz
+    :type compress: bool, optional
+    :return: The number of rows written
+    :rtype: int
+    """
+    if kind not in EXPORTS: raise MulticraftException(f"Unknown export '{kind}', expected one of {list(EXPORTS.keys())}")
+    rows, fields = EXPORTS[kind]
+    with RowWriter(path, fields, format, compress) as writer:
+        for row in rows(api, server_id, **kw): writer.write(row)
+    return writer.rows
+
+def export_many(api, kind:str, server_ids:list[int], path:str='{kind}-{server_id}.ndjson', format:str=None, compress:bool=None, max_workers:int=4, return_exceptions:bool=True, **kw) -> dict[int, int|Exception]:
+    """
+    Export many servers concurrently, each into its own file
+
+    :param api: The client to use
+    :type api: MulticraftAPI
+    :param kind: 'players', 'chat' or 'log'
+    :type kind: str
+    :param server_ids: The ids of the servers
+    :type server_ids: list[int]
+    :param path: The file name, {kind} and {server_id} are replaced, defaults to '{kind}-{server_id}.ndjson'
+    :type path: str, optional
+    :param format: 'ndjson' or 'csv', defaults to the file extension
+    :type format: str, optional
+    :param compress: Gzip the files, defaults to True if path ends in .gz
+    :type compress: bool, optional
+    :param max_workers: The maximum number of servers exported at once, defaults to 4
+    :type max_workers: int, optional
+    :param return_exceptions: Return exceptions in place of row counts instead of raising the first one, defaults to True
+    :type return_exceptions: bool, optional
+    :return: The number of rows written for each server {SERVER_ID: ROWS}
+    :rtype: dict[int, int|Exception]
+    """
+    server_ids = [int(x) for x in server_ids]
+    with ThreadPoolExecutor(max(1, int(max_workers)), thread_name_prefix='multicraft-export') as pool:
+        futures = {x: pool.submit(export_server, api, kind, x, path.format(kind=kind, server_id=x), format, compress, **kw) for x in server_ids}
+    res = {}
+    for server_id, future in futures.items():
+        if future.exception() is not None and not return_exceptions: raise future.exception()
+        res[server_id] = future.exception() or future.result()
+    return res
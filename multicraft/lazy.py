@@ -0,0 +1,136 @@
+"""
+Lazy models that only fetch their full record when a missing field is read
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+__all__ = ['LazyBatch', 'lazy_models']
+
+_classes = {}
+
+class LazyBatch:
+    def __init__(self, getter, ids:list[int], batch_size:int=8):
+        """
+        A group of lazy models that share one fetcher. When one model is loaded the next pending models in the group are fetched with it.
+
+        :param getter: The method used to fetch a single record, for example MulticraftAPI.get_player
+        :type getter: Callable[[int], object]
+        :param ids: The ids of the records in this group, in list order
+        :type ids: list[int]
+        :param batch_size: How many pending records to fetch together, defaults to 8
+        :type batch_size: int, optional
+        """
+        self.getter = getter
+        self.ids = [int(x) for x in ids]
+        self.batch_size = max(1, int(batch_size))
+        self._lock = threading.Lock()
+        self._records = {}
+        self._flights: dict[int, Future] = {}
+
+    def __repr__(self):
+        return f"LazyBatch(loaded={len(self._records)}, total={len(self.ids)})"
+
+    def pending(self) -> list[int]:
+        """
+        Get the ids of the records that have not been fetched yet
+
+        :return: The pending ids
+        :rtype: list[int]
+        """
+        return [x for x in self.ids if x not in self._records]
+
+    def _get(self, id:int):
+        try: record = self.getter(id)
+        except BaseException:
+            # Not kept, the next read of this id tries again
+            with self._lock: self._flights.pop(id, None)
+            raise
+        with self._lock:
+            self._records[id] = record
+            self._flights.pop(id, None)
+        return record
+
+    def fetch(self, id:int):
+        """
+        Get the record for this id. If it has not been fetched yet the nearest pending records are fetched with it. Only a failure to fetch this id is raised, neighbours that failed are fetched again when they are read.
+
+        :param id: The id of the record
+        :type id: int
+        :return: The fetched record
+        :rtype: object
+        """
+        id = int(id)
+        with self._lock:
+            if id in self._records: return self._records[id]
+            if id not in self._flights:
+                pending = [x for x in self.pending() if x not in self._flights]
+                start = pending.index(id) if id in pending else 0
+                ids = [id] + [x for x in pending[start:start + self.batch_size] if x != id][:self.batch_size - 1]
+                # Workers wait for the lock, so every flight is registered before any finishes
+                pool = ThreadPoolExecutor(len(ids), thread_name_prefix='multicraft-lazy')
+                for x in ids: self._flights[x] = pool.submit(self._get, x)
+                pool.shutdown(wait=False)
+            future = self._flights[id]
+        return future.result()
+
+class Lazy:
+    """
+    Mixin for a model that only has its id and name until another field is read
+    """
+    _eager = frozenset(['id', 'name', '_id', '_name', '_lazy_batch', '_lazy_loaded', 'loaded', 'load', 'api', '_api', 'bind', 'start', 'stop', 'restart', 'kill', 'delete'])
+
+    def __getattribute__(self, name:str):
+        if not name.startswith('__') and name not in Lazy._eager and not object.__getattribute__(self, '_lazy_loaded'):
+            object.__getattribute__(self, 'load')()
+        return super().__getattribute__(name)
+
+    def __repr__(self):
+        return f"{type(self).__mro__[2].__name__}(id={self.id}, name='{self.name}', loaded={self.loaded})"
+
+    @property
+    def loaded(self) -> bool:
+        return object.__getattribute__(self, '_lazy_loaded')
+
+    def load(self):
+        """
+        Fetch the full record now
+        """
+        if self._lazy_loaded: return self
+        record = self._lazy_batch.fetch(self.id)
+        for k, v in vars(record).items(): self.__dict__.setdefault(k, v)
+        self._lazy_loaded = True
+        return self
+
+def _lazy_class(cls):
+    if cls not in _classes:
+        _classes[cls] = type(f"Lazy{cls.__name__}", (Lazy, cls), {})
+    return _classes[cls]
+
+def lazy_models(cls, getter, items:dict[str, str], batch_size:int=8, api=None) -> dict[str, object]:
+    """
+    Convert an {ID: NAME} dict from a "list" method into lazy models
+
+    :param cls: The model class, for example Player
+    :type cls: type
+    :param getter: The method used to fetch a single record, for example MulticraftAPI.get_player
+    :type getter: Callable[[int], object]
+    :param items: The {ID: NAME} dict
+    :type items: dict[str, str]
+    :param batch_size: How many pending records to fetch together, defaults to 8
+    :type batch_size: int, optional
+    :param api: The client to bind the models to, defaults to None
+    :type api: MulticraftAPI, optional
+    :return: The lazy models {ID: MODEL}
+    :rtype: dict[str, object]
+    """
+    batch = LazyBatch(getter, list(items.keys()), batch_size)
+    lazy_cls = _lazy_class(cls)
+    res = {}
+    for id, name in items.items():
+        self = lazy_cls.__new__(lazy_cls)
+        self.__dict__.update({'_lazy_batch': batch, '_lazy_loaded': False})
+        self.id = id
+        self.name = name
+        if api is not None: self._api = api
+        res[id] = self
+    return res
@@ -0,0 +1,50 @@
+"""
+Client-side rate limiting
+"""
+import threading
+import time
+
+__all__ = ['RateLimiter']
+
+class RateLimiter:
+    def __init__(self, rate:float, burst:int=None):
+        """
+        A token bucket shared by every thread that uses the same client
+
+        :param rate: The number of calls allowed per second
+        :type rate: float
+        :param burst: The number of calls that may be made at once after being idle, defaults to max(1, rate)
+        :type burst: int, optional
+        """
+        if rate <= 0: raise ValueError('rate must be greater than 0')
+        self.rate = float(rate)
+        self.burst = max(1, int(rate if burst is None else burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"RateLimiter(rate={self.rate}, burst={self.burst})"
+
+    def acquire(self, timeout:float=None) -> bool:
+        """
+        Wait until a call may be made
+
+        :param timeout: The maximum seconds to wait, defaults to None
+        :type timeout: float, optional
+        :return: False if the timeout passed first
+        :rtype: bool
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                delay = (1 - self._tokens) / self.rate
+            if end is not None:
+                if now + delay > end: return False
+            time.sleep(delay)
@@ -0,0 +1,330 @@
+"""
+Parse get_server_log output into structured events
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from typing import NamedTuple
+import threading
+import os
+import re
+
+__all__ = ['LogEvent', 'LogPatterns', 'LogTail', 'LogAnalysis', 'DEFAULT_PATTERNS', 'parse_log_line', 'extract_events', 'parse_log']
+
+LINE_PATTERN = re.compile(r'^\[(?P<timestamp>[^\]]*)\]\s*(?:\[(?:(?P<thread>[^\]/]*)/)?(?P<level>[A-Z]+)\]:?\s*)?(?P<message>.*)$')
+GROUP_PATTERN = re.compile(r'\(\?P<(\w+)>')
+
+class LogEvent(NamedTuple):
+    index: int
+    line: str
+    timestamp: str = None
+    level: str = None
+    thread: str = None
+    message: str = None
+    category: str = None
+    data: dict = None
+
+    def __repr__(self):
+        return f"LogEvent(index={self.index}, level='{self.level}', category='{self.category}')"
+
+    def __str__(self) -> str:
+        return f"LogEvent(index={self.index}, timestamp='{self.timestamp}', level='{self.level}', thread='{self.thread}', message='{self.message}')"
+
+class LogPatterns:
+    def __init__(self, patterns:dict[str, str]=None):
+        """
+        A registry of named message patterns that are compiled into one combined matcher. When several patterns match a message the one registered first wins.
+
+        Named groups in a pattern are returned as the event's data.
+
+        :param patterns: The patterns to register {NAME: PATTERN}, defaults to None
+        :type patterns: dict[str, str], optional
+        """
+        self._patterns: dict[str, str] = {}
+        self._matcher = None
+        self._groups = {}
+        for name, pattern in ({} if patterns is None else patterns).items(): self.register(name, pattern)
+
+    def __repr__(self):
+        return f"LogPatterns({list(self._patterns.keys())})"
+
+    def __contains__(self, name:str) -> bool:
+        return name in self._patterns
+
+    def register(self, name:str, pattern:str):
+        """
+        Register a named pattern. Patterns are searched anywhere in the message unless they start with "^".
+
+        :param name: The category name of the pattern
+        :type name: str
+        :param pattern: The regular expression
+        :type pattern: str
+        :return: This registry
+        :rtype: LogPatterns
+        """
+        if not str(name).isidentifier(): raise ValueError(f"Invalid pattern name '{name}'")
+        re.compile(pattern)
+        self._patterns[str(name)] = str(pattern)
+        self._matcher = None
+        return self
+
+    def unregister(self, name:str):
+        """
+        Remove a named pattern
+
+        :param name: The category name of the pattern
+        :type name: str
+        :return: This registry
+        :rtype: LogPatterns
+        """
+        self._patterns.pop(str(name), None)
+        self._matcher = None
+        return self
+
+    def copy(self):
+        """
+        Copy this registry
+
+        :return: The copy
+        :rtype: LogPatterns
+        """
+        return LogPatterns(self._patterns)
+
+    def compile(self) -> re.Pattern:
+        """
+        Compile every pattern into one combined matcher
+
+        :return: The combined matcher
+        :rtype: re.Pattern
+        """
+        if self._matcher is not None: return self._matcher
+        alternatives = []
+        self._groups = {}
+        for i, (name, pattern) in enumerate(self._patterns.items()):
+            key = f"_{i}"
+            self._groups[key] = (name, {f"{key}_{x}": x for x in GROUP_PATTERN.findall(pattern)})
+            pattern = GROUP_PATTERN.sub(lambda m: f"(?P<{key}_{m.group(1)}>", pattern)
+            pattern = pattern[1:] if pattern.startswith('^') else '.*?' + pattern
+            alternatives.append(f"(?P<{key}>{pattern})")
+        self._matcher = re.compile('|'.join(alternatives) or '(?!)')
+        return self._matcher
+
+    def match(self, message:str) -> tuple[str, dict]|None:
+        """
+        Match this message against every pattern in a single pass
+
+        :param message: The log message
+        :type message: str
+        :return: The category name and named groups, None if nothing matched
+        :rtype: tuple[str, dict]|None
+        """
+        m = self.compile().match(message)
+        if m is None: return None
+        name, groups = self._groups[m.lastgroup]
+        return name, {v: m.group(k) for k, v in groups.items()}
+
+    def __getstate__(self):
+        return self._patterns
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+DEFAULT_PATTERNS = LogPatterns({
+    'join': r'^(?P<player>\w+)(?: \([^)]*\))? joined the game',
+    'leave': r'^(?P<player>\w+) left the game',
+    'chat': r'^(?:\[[^\]]*\] )?<(?P<player>[^>]+)> (?P<text>.*)$',
+    'command': r'^(?P<player>\w+) issued server command: (?P<command>.*)$',
+    'lag': r"Can't keep up! Is the server overloaded\?(?: Running (?P<ms>\d+)ms or (?P<ticks>\d+) ticks behind)?",
+    'error': r'(?P<exception>[\w.$]*(?:Exception|Error))\b|^Caused by:'
+})
+
+def parse_log_line(line:str, index:int=0, patterns:LogPatterns=None) -> LogEvent:
+    """
+    Parse a single log line
+
+    :param line: The log line
+    :type line: str
+    :param index: The position of this line in the log, defaults to 0
+    :type index: int, optional
+    :param patterns: The patterns used to categorize the message, defaults to DEFAULT_PATTERNS
+    :type patterns: LogPatterns, optional
+    :return: The parsed event
+    :rtype: LogEvent
+    """
+    if patterns is None: patterns = DEFAULT_PATTERNS
+    m = LINE_PATTERN.match(line)
+    if m is None: timestamp, level, thread, message = None, None, None, line
+    else: timestamp, level, thread, message = m.group('timestamp', 'level', 'thread', 'message')
+    res = patterns.match(message)
+    if res is None: return LogEvent(index, line, timestamp, level, thread, message)
+    return LogEvent(index, line, timestamp, level, thread, message, res[0], res[1])
+
+def extract_events(lines, patterns:LogPatterns=None, categories:list[str]=None, start:int=0):
+    """
+    Parse these lines one at a time. Works with the get_server_log output or a stream such as LogTail.follow()
+
+    :param lines: The log lines
+    :type lines: Iterable[str]
+    :param patterns: The patterns used to categorize the message, defaults to DEFAULT_PATTERNS
+    :type patterns: LogPatterns, optional
+    :param categories: Only yield events with one of these categories, defaults to None
+    :type categories: list[str], optional
+    :param start: The index of the first line, defaults to 0
+    :type start: int, optional
+    :return: The parsed events
+    :rtype: Iterator[LogEvent]
+    """
+    if patterns is None: patterns = DEFAULT_PATTERNS
+    patterns.compile()
+    for i, line in enumerate(lines, start):
+        event = parse_log_line(line, i, patterns)
+        if categories is None or event.category in categories: yield event
+
+def _parse_chunk(chunk:tuple[int, list[str], LogPatterns]) -> list[LogEvent]:
+    offset, lines, patterns = chunk
+    return list(extract_events(lines, patterns, start=offset))
+
+class LogTail:
+    def __init__(self, api, server_id:int, overlap:int=3):
+        """
+        Follow the server's log. Each poll only returns the lines that were not seen before.
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param server_id: The id of the server
+        :type server_id: int
+        :param overlap: The number of previously seen lines used to find where the new lines start, defaults to 3
+        :type overlap: int, optional
+        """
+        self.api = api
+        self.server_id = int(server_id)
+        self.overlap = max(1, int(overlap))
+        self.count = 0
+        self._last = []
+
+    def __repr__(self):
+        return f"LogTail(server_id={self.server_id}, count={self.count})"
+
+    def feed(self, lines:list[str]) -> list[str]:
+        """
+        Get the lines that were not seen before from a full get_server_log result
+
+        :param lines: The lines from get_server_log
+        :type lines: list[str]
+        :return: The new lines
+        :rtype: list[str]
+        """
+        new = lines
+        anchor = self._last
+        if len(anchor) > 0:
+            for i in range(len(lines) - 1, -1, -1):
+                n = min(i + 1, len(anchor))
+                if lines[i + 1 - n:i + 1] == anchor[-n:]:
+                    new = lines[i + 1:]
+                    break
+        if len(lines) > 0: self._last = lines[-self.overlap:]
+        self.count += len(new)
+        return new
+
+    def poll(self) -> list[str]:
+        """
+        Fetch the server's log and return the new lines
+
+        :return: The new lines
+        :rtype: list[str]
+        """
+        return self.feed(self.api.get_server_log(self.server_id))
+
+    def follow(self, interval:float=2.0, stop=None):
+        """
+        Yield new lines as they are written
+
+        :param interval: Seconds between polls, defaults to 2.0
+        :type interval: float, optional
+        :param stop: Stop following once this event is set, defaults to None
+        :type stop: threading.Event, optional
+        :return: The new lines
+        :rtype: Iterator[str]
+        """
+        stop = threading.Event() if stop is None else stop
+        while not stop.is_set():
+            yield from self.poll()
+            stop.wait(interval)
+
+class LogAnalysis:
+    def __init__(self, events:list[LogEvent]):
+        self.events = events
+
+    def __repr__(self):
+        return f"LogAnalysis(events={len(self.events)}, levels={dict(self.levels)}, categories={dict(self.categories)})"
+
+    @property
+    def levels(self) -> Counter:
+        """
+        The number of events for each level
+        """
+        return Counter(x.level for x in self.events if x.level is not None)
+
+    @property
+    def categories(self) -> Counter:
+        """
+        The number of events for each category (join, leave, chat, command, lag, error)
+        """
+        return Counter(x.category for x in self.events if x.category is not None)
+
+    def filter(self, level:str=None, category:str=None) -> list[LogEvent]:
+        """
+        Get the events that match this level and category
+
+        :param level: The level to match, defaults to None
+        :type level: str, optional
+        :param category: The category to match, defaults to None
+        :type category: str, optional
+        :return: The matching events in log order
+        :rtype: list[LogEvent]
+        """
+        return [x for x in self.events if (level is None or x.level == level) and (category is None or x.category == category)]
+
+    @classmethod
+    def from_server(cls, api, server_id:int, processes:int=None, chunk_size:int=5000, patterns:LogPatterns=None):
+        """
+        Fetch the server's log and parse it
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param server_id: The id of the server
+        :type server_id: int
+        :param processes: The number of worker processes, defaults to os.cpu_count()
+        :type processes: int, optional
+        :param chunk_size: The number of lines for each worker task, defaults to 5000
+        :type chunk_size: int, optional
+        :param patterns: The patterns used to categorize messages, defaults to DEFAULT_PATTERNS
+        :type patterns: LogPatterns, optional
+        :return: The parsed log
+        :rtype: LogAnalysis
+        """
+        return parse_log(api.get_server_log(server_id), processes, chunk_size, patterns)
+
+def parse_log(lines:list[str], processes:int=None, chunk_size:int=5000, patterns:LogPatterns=None) -> LogAnalysis:
+    """
+    Parse these log lines across a process pool. Logs that fit in a single chunk are parsed in this process.
+
+    :param lines: The lines from get_server_log
+    :type lines: list[str]
+    :param processes: The number of worker processes, defaults to os.cpu_count()
+    :type processes: int, optional
+    :param chunk_size: The number of lines for each worker task, defaults to 5000
+    :type chunk_size: int, optional
+    :param patterns: The patterns used to categorize messages, defaults to DEFAULT_PATTERNS
+    :type patterns: LogPatterns, optional
+    :return: The parsed log, in log order
+    :rtype: LogAnalysis
+    """
+    chunk_size = max(1, int(chunk_size))
+    chunks = [(i, lines[i:i + chunk_size], patterns) for i in range(0, len(lines), chunk_size)]
+    if processes is None: processes = os.cpu_count() or 1
+    if len(chunks) <= 1 or processes <= 1:
+        return LogAnalysis([x for chunk in chunks for x in _parse_chunk(chunk)])
+    events = []
+    with ProcessPoolExecutor(processes) as pool:
+        for res in pool.map(_parse_chunk, chunks): events.extend(res)
+    return LogAnalysis(events)
@@ -1,7 +1,9 @@
 from enum import Enum
 import datetime
 
-__all__ = ['Status','ScheduleStatus','Role','Mode','BackupStatus','User','Server','Command','ServerStatus','ChatMessage','Player','ServerResources','Schedule','Database','Backup']
+from . import MulticraftException
+
+__all__ = ['Status','ScheduleStatus','Role','Mode','BackupStatus','User','Server','Command','ServerStatus','ChatMessage','Player','ServerResources','Schedule','Database','Backup','bulk','to_json']
 
 class Status(Enum):
     online = 'online'
@@ -14,13 +16,10 @@ class ScheduleStatus(Enum):
     paused = 3
 
     @classmethod
-    def from_int(self, value):
-        match value:
-            case 0: return ScheduleStatus.scheduled
-            case 1: return ScheduleStatus.rescheduled
-            case 2: return ScheduleStatus.done
-            case 3: return ScheduleStatus.paused
-            case _: return ScheduleStatus.scheduled
+    def from_int(cls, value):
+        return _SCHEDULE_STATUSES.get(value, ScheduleStatus.scheduled)
+
+_SCHEDULE_STATUSES = {x.value: x for x in ScheduleStatus}
 
 class Role(Enum):
     none = 'none'
@@ -34,28 +33,13 @@ class Role(Enum):
 
     @classmethod
     def from_int(cls, value:int):
-        match value:
-            case 0: return Role.none
-            case 20: return Role.user
-            case 10: return Role.guest
-            case 30: return Role.mod
-            case 35: return Role.smod
-            case 40: return Role.admin
-            case 45: return Role.coowner
-            case 50: return Role.owner
-            case _: return Role.none
+        return _ROLE_FROM_INT.get(value, Role.none)
 
     def to_int(self) -> int:
-        match self._value_:
-            case 'none': return 0
-            case 'user': return 20
-            case 'guest': return 10
-            case 'mod': return 30
-            case 'smod': return 35
-            case 'admin': return 40
-            case 'coowner': return 45
-            case 'owner': return 50
-            case _: return 0
+        return _ROLE_TO_INT[self._value_]
+
+_ROLE_TO_INT = {'none': 0, 'user': 20, 'guest': 10, 'mod': 30, 'smod': 35, 'admin': 40, 'coowner': 45, 'owner': 50}
+_ROLE_FROM_INT = {v: Role(k) for k, v in _ROLE_TO_INT.items()}
 
 class Mode(Enum):
     ro = 'ro'
@@ -64,6 +48,87 @@ class Mode(Enum):
 class BackupStatus(Enum):
     done = 'done'
 
+# Name to member tables, Enum[name] goes through a Python level __getitem__ on every call
+STATUSES = dict(Status.__members__)
+ROLES = dict(Role.__members__)
+MODES = dict(Mode.__members__)
+BACKUP_STATUSES = dict(BackupStatus.__members__)
+
+_strings: dict[str, str] = {}
+
+def _intern(value) -> str:
+    """
+    Get the shared copy of a short string, so the same daemon, host, chat sender or quit reason decoded for thousands of models is only stored once. Only used for fields with few distinct values, ids, ips and free text would just fill the pool.
+    """
+    # Pooled strings are found without a str() call, only str keys are ever stored
+    res = _strings.get(value)
+    if res is not None: return res
+    value = str(value)
+    if len(value) > 64: return value
+    if len(_strings) >= 65536: _strings.clear()
+    return _strings.setdefault(value, value)
+
+class Bound:
+    """
+    A model that can carry out its own operations through the client that returned it
+    """
+    @property
+    def api(self):
+        api = getattr(self, '_api', None)
+        if api is None: raise MulticraftException(f"{self.__class__.__name__} is not bound to a client")
+        return api
+
+    @api.setter
+    def api(self, value):
+        setattr(self, '_api', value)
+
+    def bind(self, api):
+        """
+        Bind this model to a client
+
+        :param api: The client to use, MulticraftAPI or AsyncMulticraftAPI
+        :type api: MulticraftAPI
+        :return: This model
+        :rtype: Self
+        """
+        self.api = api
+        return self
+
+def bulk(models:list, action:str, *args, max_workers:int=8, return_exceptions:bool=False) -> list:
+    """
+    Run this action on every model concurrently through the client of the first model
+
+    :param models: The bound models
+    :type models: list
+    :param action: The name of the method to call, for example "start" or "delete"
+    :type action: str
+    :param max_workers: The maximum number of calls in flight, defaults to 8
+    :type max_workers: int, optional
+    :param return_exceptions: Return exceptions in place of results instead of raising the first one, defaults to False
+    :type return_exceptions: bool, optional
+    :return: The results in the same order as models. A coroutine if the models are bound to an AsyncMulticraftAPI
+    :rtype: list
+    """
+    models = list(models)
+    if len(models) == 0: return []
+    return models[0].api.bulk(lambda m: getattr(m, action)(*args), models, max_workers=max_workers, return_exceptions=return_exceptions)
+
+def to_json(obj):
+    """
+    Convert a result into something json.dumps accepts
+
+    :param obj: The result of an API call
+    :type obj: object
+    :return: The JSON compatible value
+    :rtype: object
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)): return obj
+    if isinstance(obj, Enum): return obj.value
+    if isinstance(obj, datetime.datetime): return obj.timestamp()
+    if isinstance(obj, dict): return {str(k): to_json(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)): return [to_json(x) for x in obj]
+    return {k.lstrip('_'): to_json(v) for k, v in vars(obj).items() if k not in ('_api', '_lazy_batch', '_lazy_loaded')}
+
 class User:
     def __init__(self, id:int, name:str, email:str, global_role: str, lang:str, theme:str, gauth_secret:str, gauth_token:str, timezone:str):
         self.id = id
@@ -173,7 +238,7 @@ class User:
         if 'timezone' in data: self.timezone = data.pop('timezone')
         return self
 
-class Server:
+class Server(Bound):
     def __init__(self, id:int, name:str, daemon_id:int=None, ip:str=None, port:int=None, players:int=None, memory:int=None):
         self.id = id
         self.name = name
@@ -216,7 +281,7 @@ class Server:
     
     @daemon_id.setter
     def daemon_id(self, value:str):
-        setattr(self, '_daemon_id', str(value))
+        setattr(self, '_daemon_id', _intern(value))
 
     @property
     def ip(self) -> str:
@@ -269,16 +334,28 @@ class Server:
             raise TypeError(f"Expected int but got '{value.__class__.__name__}' instead")
 
     def start(self):
-        raise NotImplementedError()
+        """
+        Start this server
+        """
+        return self.api.start_server(self.id)
     
     def stop(self):
-        raise NotImplementedError()
+        """
+        Stop this server
+        """
+        return self.api.stop_server(self.id)
     
     def restart(self):
-        raise NotImplementedError()
+        """
+        Restart this server
+        """
+        return self.api.restart_server(self.id)
     
     def kill(self):
-        raise NotImplementedError()
+        """
+        Kill this server
+        """
+        return self.api.kill_server(self.id)
     
     @classmethod
     def from_json(cls, data:dict):
@@ -292,7 +369,7 @@ class Server:
         if 'memory' in data: self.memory = data.pop('memory')
         return self
 
-class Command:
+class Command(Bound):
     def __init__(self, id:int, name:str, server_id:int=None, level:int=None, prereq:int=0, chat:str=None, response:str=None, run:str=None, hidden:bool=None, role:Role=None):
         self.id = id
         self.name = name
@@ -301,11 +378,11 @@ class Command:
         self.prereq = prereq
         self.chat = chat
         self.response = response
-        self.run = run
+        self.console_command = run
         self.hidden = hidden
 
         if role is not None:
-            self.level = Role[role].to_int()
+            self.level = ROLES[role].to_int()
 
     def __repr__(self):
         return f"Command(id={self.id}, name='{self.name}')"
@@ -395,11 +472,14 @@ class Command:
         setattr(self, '_response', str(value))
 
     @property
-    def run(self) -> str:
+    def console_command(self) -> str:
+        """
+        The "run" field of this command. Named console_command so it does not clash with run()
+        """
         return getattr(self, '_run', None)
     
-    @run.setter
-    def run(self, value:str):
+    @console_command.setter
+    def console_command(self, value:str):
         setattr(self, '_run', str(value))
 
     @property
@@ -423,19 +503,28 @@ class Command:
         self.name = data.pop('name')
         if 'server_id' in data: self.server_id = data.pop('server_id')
         if 'level' in data: self.level = data.pop('level')
-        if 'role' in data: self.level = Role[data.pop('role')].to_int()
+        if 'role' in data: self.level = ROLES[data.pop('role')].to_int()
         if 'prereq' in data: self.prereq = data.pop('prereq')
         if 'chat' in data: self.chat = data.pop('chat')
         if 'response' in data: self.response = data.pop('response')
-        if 'run' in data: self.run = data.pop('run')
+        if 'run' in data: self.console_command = data.pop('run')
         if 'hidden' in data: self.hidden = data.pop('hidden')
         return self
     
     def delete(self):
-        raise NotImplementedError()
+        """
+        Remove this command
+        """
+        return self.api.delete_command(self.id)
     
-    def run(self):
-        raise NotImplementedError()
+    def run(self, run_for:int=0):
+        """
+        Run this command
+
+        :param run_for: The id of the player to run this command for, defaults to 0
+        :type run_for: int, optional
+        """
+        return self.api.run_command(self.server_id, self.id, run_for)
     
 class ServerStatus:
     def __init__(self, status:Status, online_players:int, max_players:int, players:list=[]):
@@ -457,7 +546,7 @@ class ServerStatus:
     @status.setter
     def status(self, value:Status):
         if isinstance(value, str):
-            self.status = Status[str(value)]
+            self.status = STATUSES[value]
         elif isinstance(value, Status):
             setattr(self, '_status', value)
         else:
@@ -570,7 +659,7 @@ class ChatMessage:
     
     @name.setter
     def name(self, value:str):
-        setattr(self, '_name', str(value))
+        setattr(self, '_name', _intern(value))
     
     @property
     def time(self) -> datetime:
@@ -595,7 +684,7 @@ class ChatMessage:
         if 'time' in data: self.time = data.pop('time')
         return self
 
-class Player:
+class Player(Bound):
     def __init__(self, id:int, name:str, server_id:int=None, level:int=0, lastseen:datetime.datetime=None, banned:bool=None, op:bool=None, status: Status=Status.offline, ip:str=None, previps:str=None, quitreason:str=None):
         self.id = id
         self.name = name
@@ -658,7 +747,7 @@ class Player:
     def level(self, value:int):
         if value is None: self.level = 0
         elif isinstance(value, str):
-            self.server_id = int(value)
+            self.level = int(value)
         elif isinstance(value, int):
             setattr(self, '_level', value)
         else:
@@ -673,10 +762,10 @@ class Player:
         if value is None: self.lastseen = 0.0
         elif isinstance(value, str):
             self.lastseen = float(value)
-        elif isinstance(value, float):
+        elif isinstance(value, (float, int)):
             self.lastseen = datetime.datetime.fromtimestamp(value)
         elif isinstance(value, datetime.datetime):
-            setattr(self, '_level', value)
+            setattr(self, '_lastseen', value)
         else:
             raise TypeError(f"Expected float but got '{value.__class__.__name__}' instead")
 
@@ -716,7 +805,7 @@ class Player:
     def status(self, value:bool):
         if value is None: self.status = Status.offline
         elif isinstance(value, str):
-            self.status = Status[value]
+            self.status = STATUSES[value]
         elif isinstance(value, Status):
             setattr(self, '_status', value)
         else:
@@ -747,7 +836,7 @@ class Player:
     @quitreason.setter
     def quitreason(self, value:bool):
         if value is None: setattr(self, '_quitreason', None)
-        else: setattr(self, '_quitreason', str(value))
+        else: setattr(self, '_quitreason', _intern(value))
 
     @classmethod
     def from_json(cls, data:dict):
@@ -766,9 +855,12 @@ class Player:
         return self
     
     def delete(self):
-        raise NotImplementedError()
+        """
+        Remove this player
+        """
+        return self.api.delete_player(self.id)
     
-class Schedule:
+class Schedule(Bound):
     def __init__(self, id:int, name:str, server_id:int=None, scheduled_ts:datetime.datetime=None, last_run_ts:datetime.datetime=None, interval:float=None, command:int=None, run_for:int=None, status:int=None, args:str=None, hidden:bool=None, **kw):
         self.id = id
         self.name = name
@@ -953,10 +1045,14 @@ class Schedule:
         return self
 
     def delete(self):
-        raise NotImplementedError()
+        """
+        Remove this schedule
+        """
+        return self.api.delete_schedule(self.id)
 
-class Database:
-    def __init__(self, host:str, name:str, username:str, password:str, link:str):
+class Database(Bound):
+    def __init__(self, host:str, name:str, username:str, password:str, link:str, server_id:int=None):
+        self.server_id = server_id
         self.host = host
         self.name = name
         self.username = username
@@ -969,13 +1065,27 @@ class Database:
     def __str__(self) -> str:
         return f"Database(host='{self.host}', name='{self.name}', username='{self.username}', link='{self.link}')"
     
+    @property
+    def server_id(self) -> int:
+        return getattr(self, '_server_id', 0)
+    
+    @server_id.setter
+    def server_id(self, value:int):
+        if value is None: self.server_id = 0
+        elif isinstance(value, str):
+            self.server_id = int(value)
+        elif isinstance(value, int):
+            setattr(self, '_server_id', value)
+        else:
+            raise TypeError(f"Expected int but got '{value.__class__.__name__}' instead")
+
     @property
     def host(self) -> str:
         return getattr(self, '_host')
     
     @host.setter
     def host(self, value:str):
-        setattr(self, '_host', str(value))
+        setattr(self, '_host', _intern(value))
 
     @property
     def name(self) -> str:
@@ -1012,6 +1122,7 @@ class Database:
     @classmethod
     def from_json(cls, data:dict):
         self = cls.__new__(cls)
+        if 'server_id' in data: self.server_id = data.pop('server_id')
         if 'host' in data: self.host = data.pop('host')
         if 'name' in data: self.name = data.pop('name')
         if 'username' in data: self.username = data.pop('username')
@@ -1020,7 +1131,10 @@ class Database:
         return self
 
     def delete(self):
-        raise NotImplementedError()
+        """
+        Remove this database
+        """
+        return self.api.delete_database(self.server_id)
 
 class Backup:
     def __init__(self, status:BackupStatus, ftp:str, message:str, file:str, time:datetime.datetime):
@@ -1044,9 +1158,9 @@ class Backup:
     def status(self, value:BackupStatus):
         if value is None: self.status = BackupStatus.done
         elif isinstance(value, str):
-            self.status = BackupStatus[value]
+            self.status = BACKUP_STATUSES[value]
         elif isinstance(value, BackupStatus):
-            setattr(self, '_status', str(value))
+            setattr(self, '_status', value)
         else:
             raise TypeError(f"Expected BackupStatus but got '{value.__class__.__name__}' instead")
 
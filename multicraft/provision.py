@@ -0,0 +1,370 @@
+"""
+Keep the same custom commands and user access on many servers
+"""
+import math
+import threading
+import time
+
+from . import Command, Role, Mode
+from .model import ROLES, MODES
+
+__all__ = ['CommandSpec', 'CommandDiff', 'CommandSync', 'AccessChange', 'AccessSync']
+
+class CommandSpec:
+    def __init__(self, name:str, role:Role=Role.user, chat:str='', response:str='', run:str=''):
+        """
+        A command as it should exist on every server. Commands are matched by name.
+
+        :param name: The name of the command
+        :type name: str
+        :param role: The role needed to use it, defaults to Role.user
+        :type role: Role, optional
+        :param chat: The chat command, defaults to ''
+        :type chat: str, optional
+        :param response: The response text, defaults to ''
+        :type response: str, optional
+        :param run: The console command to run, defaults to ''
+        :type run: str, optional
+        """
+        if not isinstance(role, Role): raise TypeError(f"Expected Role but got '{role.__class__.__name__}' instead")
+        self.name = str(name)
+        self.role = role
+        self.chat = str(chat)
+        self.response = str(response)
+        self.run = str(run)
+
+    def __repr__(self):
+        return f"CommandSpec(name='{self.name}', role={self.role})"
+
+    def changes(self, command:Command) -> tuple[list[str], list[str]]:
+        """
+        Get the fields of this command that differ from the spec
+
+        :param command: The command on the server
+        :type command: Command
+        :return: The fields and values to pass to update_command, both empty if nothing changed
+        :rtype: tuple[list[str], list[str]]
+        """
+        fields, values = [], []
+        if command.level != self.role.to_int():
+            fields.append('level')
+            values.append(str(self.role.to_int()))
+        for field, current in (('chat', command.chat), ('response', command.response), ('run', command.console_command)):
+            if (current or '') != getattr(self, field):
+                fields.append(field)
+                values.append(getattr(self, field))
+        return fields, values
+
+class CommandDiff:
+    def __init__(self, server_id:int):
+        """
+        The calls needed to bring one server in line, and after apply() what happened
+
+        :param server_id: The id of the server
+        :type server_id: int
+        """
+        self.server_id = int(server_id)
+        self.create: list[CommandSpec] = []
+        self.update: list[tuple[Command, list[str], list[str]]] = []
+        self.delete: list[Command] = []
+        self.unchanged = 0
+        self.errors: list[Exception] = []
+
+    def __repr__(self):
+        return f"CommandDiff(server_id={self.server_id}, create={len(self.create)}, update={len(self.update)}, delete={len(self.delete)}, unchanged={self.unchanged}, errors={len(self.errors)})"
+
+    def __str__(self) -> str:
+        lines = [f"Server {self.server_id}: {len(self.create)} to create, {len(self.update)} to update, {len(self.delete)} to delete, {self.unchanged} unchanged"]
+        lines += [f"  + {x.name}" for x in self.create]
+        lines += [f"  ~ {x.name} ({', '.join(fields)})" for x, fields, _ in self.update]
+        lines += [f"  - {x.name}" for x in self.delete]
+        lines += [f"  ! {x}" for x in self.errors]
+        return '\n'.join(lines)
+
+    def __len__(self) -> int:
+        return len(self.create) + len(self.update) + len(self.delete)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) == 0
+
+class CommandSync:
+    def __init__(self, api, commands:list[CommandSpec], prune:bool=False, max_workers:int=8):
+        """
+        Create a new sync. plan() works out the smallest set of calls for each server and apply() makes them.
+
+        sync = CommandSync(api, [CommandSpec('spawn', Role.user, 'spawn', 'Teleporting...', 'tp {player} 0 64 0')])
+        for diff in sync.apply([1, 2, 3]).values(): print(diff)
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param commands: The commands every server should have
+        :type commands: list[CommandSpec]
+        :param prune: Delete commands that are not in the list, defaults to False
+        :type prune: bool, optional
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        """
+        self.api = api
+        self.commands = {x.name: x for x in commands}
+        self.prune = prune
+        self.max_workers = int(max_workers)
+
+    def __repr__(self):
+        return f"CommandSync(commands={len(self.commands)}, prune={self.prune})"
+
+    def fetch(self, server_ids:list[int]) -> dict[int, list[Command]|Exception]:
+        """
+        Get every command of these servers. A server that could not be read does not stop the others.
+
+        :param server_ids: The ids of the servers
+        :type server_ids: list[int]
+        :return: The commands of each server {SERVER_ID: [Command]}, or the exception if any of its calls failed
+        :rtype: dict[int, list[Command]|Exception]
+        """
+        server_ids = [int(x) for x in server_ids]
+        listed = self.api.bulk('list_commands', server_ids, self.max_workers, True)
+        res = dict(zip(server_ids, listed))
+        items = [(k, int(x)) for k, v in res.items() if not isinstance(v, Exception) for x in v.keys()]
+        for k in res.keys():
+            if not isinstance(res[k], Exception): res[k] = []
+        for (server_id, _), command in zip(items, self.api.bulk('get_command', [x for _, x in items], self.max_workers, True)):
+            if isinstance(res[server_id], Exception): continue
+            # A partial list would make missing commands look like they need creating
+            if isinstance(command, Exception): res[server_id] = command
+            else: res[server_id].append(command)
+        return res
+
+    def diff(self, server_id:int, commands:list[Command]) -> CommandDiff:
+        """
+        Compare the commands of a server with the spec
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :param commands: The commands on the server
+        :type commands: list[Command]
+        :return: The changes
+        :rtype: CommandDiff
+        """
+        diff = CommandDiff(server_id)
+        seen = set()
+        for command in sorted(commands, key=lambda x: x.id):
+            spec = self.commands.get(command.name)
+            if spec is None or command.name in seen:
+                # Unknown or duplicate
+                if self.prune or spec is not None: diff.delete.append(command)
+                continue
+            seen.add(command.name)
+            fields, values = spec.changes(command)
+            if len(fields) > 0: diff.update.append((command, fields, values))
+            else: diff.unchanged += 1
+        diff.create = [x for name, x in self.commands.items() if name not in seen]
+        return diff
+
+    def plan(self, server_ids:list[int]) -> dict[int, CommandDiff]:
+        """
+        Work out the changes for every server without making them. A server that could not be read gets no changes and its error in CommandDiff.errors.
+
+        :param server_ids: The ids of the servers
+        :type server_ids: list[int]
+        :return: The changes of each server {SERVER_ID: CommandDiff}
+        :rtype: dict[int, CommandDiff]
+        """
+        res = {}
+        for server_id, commands in self.fetch(server_ids).items():
+            if isinstance(commands, Exception):
+                res[server_id] = CommandDiff(server_id)
+                res[server_id].errors.append(commands)
+            else: res[server_id] = self.diff(server_id, commands)
+        return res
+
+    def apply(self, plan:dict[int, CommandDiff]|list[int], dry_run:bool=False) -> dict[int, CommandDiff]:
+        """
+        Make the calls of a plan concurrently. A failed call is added to the errors of its server and does not stop the others.
+
+        :param plan: A plan from plan(), or the ids of the servers to plan and apply
+        :type plan: dict[int, CommandDiff]|list[int]
+        :param dry_run: Only work out the changes, defaults to False
+        :type dry_run: bool, optional
+        :return: The report of each server {SERVER_ID: CommandDiff}
+        :rtype: dict[int, CommandDiff]
+        """
+        if not isinstance(plan, dict): plan = self.plan(plan)
+        if dry_run: return plan
+        calls = []
+        for diff in plan.values():
+            calls += [(diff, lambda d=diff, x=x: self.api.create_command(d.server_id, x.name, x.role, x.chat, x.response, x.run)) for x in diff.create]
+            calls += [(diff, lambda x=x, f=f, v=v: self.api.update_command(x.id, f, v)) for x, f, v in diff.update]
+            calls += [(diff, lambda x=x: self.api.delete_command(x.id)) for x in diff.delete]
+        results = self.api.bulk(lambda fn: fn(), [fn for _, fn in calls], self.max_workers, True)
+        for (diff, _), res in zip(calls, results):
+            if isinstance(res, Exception): diff.errors.append(res)
+        return plan
+
+class AccessChange:
+    def __init__(self, user:str|int, user_id:int, server_id:int, role:tuple, mode:tuple):
+        """
+        The role and ftp access of one user on one server, before and after
+
+        :param user: The name or id the change was asked for
+        :type user: str|int
+        :param user_id: The id of the user
+        :type user_id: int
+        :param server_id: The id of the server
+        :type server_id: int
+        :param role: The current and wanted role (CURRENT, WANTED), None if the role is already right
+        :type role: tuple[Role|None, Role|None]|None
+        :param mode: The current and wanted ftp access (CURRENT, WANTED), None if the access is already right
+        :type mode: tuple[Mode|None, Mode|None]|None
+        """
+        self.user = user
+        self.user_id = int(user_id)
+        self.server_id = int(server_id)
+        self.role = role
+        self.mode = mode
+        self.errors: list[Exception] = []
+
+    def __repr__(self):
+        return f"AccessChange(user_id={self.user_id}, server_id={self.server_id}, role={self.role}, mode={self.mode})"
+
+    def __str__(self) -> str:
+        name = lambda x: 'none' if x is None else x._value_
+        parts = []
+        if self.role is not None: parts.append(f"role {name(self.role[0])} -> {name(self.role[1])}")
+        if self.mode is not None: parts.append(f"ftp {name(self.mode[0])} -> {name(self.mode[1])}")
+        parts += [f"failed: {x}" for x in self.errors]
+        return f"User {self.user} on server {self.server_id}: {', '.join(parts)}"
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) == 0
+
+class AccessSync:
+    def __init__(self, api, max_workers:int=8, max_age:float=300.0):
+        """
+        Create a new reconciler for user roles and ftp access. Known access is remembered for max_age seconds, so running the same matrix again only reads what has expired.
+
+        sync = AccessSync(api)
+        for change in sync.apply({('staff', x): (Role.mod, Mode.ro) for x in server_ids}): print(change)
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        :param max_age: The seconds known access is trusted for, defaults to 300.0
+        :type max_age: float, optional
+        """
+        self.api = api
+        self.max_workers = int(max_workers)
+        self.max_age = float(max_age)
+        self._user_ids: dict[str, int] = {}
+        self._known: dict[tuple[int, int, str], tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        api.add_listener(self._on_call)
+
+    def __repr__(self):
+        return f"AccessSync(users={len(self._user_ids)}, known={len(self._known)})"
+
+    def close(self):
+        """
+        Stop listening to the client
+        """
+        self.api.remove_listener(self._on_call)
+
+    def _remember(self, user_id:int, server_id:int, kind:str, value):
+        with self._lock: self._known[(int(user_id), int(server_id), kind)] = (time.monotonic(), value)
+
+    def _on_call(self, method:str, params:dict, result):
+        if method == 'setUserRole':
+            self._remember(params['user_id'], params['server_id'], 'role', ROLES[params['role']] if params['role'] else None)
+        elif method == 'setUserFtpAccess':
+            self._remember(params['user_id'], params['server_id'], 'mode', MODES[params['mode']] if params['mode'] else None)
+
+    def forget(self):
+        """
+        Forget all known access, the next run reads everything again
+        """
+        with self._lock: self._known.clear()
+
+    def user_ids(self, users:list[str|int]) -> dict[str|int, int]:
+        """
+        Resolve user names to ids. Names are looked up once and remembered.
+
+        :param users: The names or ids of the users
+        :type users: list[str|int]
+        :return: The id of each user {USER: ID}
+        :rtype: dict[str|int, int]
+        """
+        names = list(dict.fromkeys(x for x in users if isinstance(x, str) and x not in self._user_ids))
+        for name, user_id in zip(names, self.api.bulk('get_user_id', names, self.max_workers)):
+            self._user_ids[name] = int(user_id)
+        return {x: self._user_ids[x] if isinstance(x, str) else int(x) for x in users}
+
+    def current(self, pairs:list[tuple[int, int]]) -> dict[tuple[int, int], tuple[Role|None, Mode|None]|Exception]:
+        """
+        Get the role and ftp access of each user on each server. Access read within max_age is not read again, and a pair that could not be read does not stop the others.
+
+        :param pairs: The user and server ids [(USER_ID, SERVER_ID)]
+        :type pairs: list[tuple[int, int]]
+        :return: The access of each pair {(USER_ID, SERVER_ID): (ROLE, MODE)}, or the exception if it could not be read
+        :rtype: dict[tuple[int, int], tuple[Role|None, Mode|None]|Exception]
+        """
+        now = time.monotonic()
+        with self._lock:
+            stale = [(u, s, k) for u, s in pairs for k in ('role', 'mode') if now - self._known.get((u, s, k), (-math.inf,))[0] > self.max_age]
+        methods = {'role': 'get_user_role', 'mode': 'get_user_ftp_access'}
+        results = self.api.bulk(lambda u, s, k: getattr(self.api, methods[k])(u, s), stale, self.max_workers, True)
+        errors = {}
+        for (u, s, k), value in zip(stale, results):
+            if isinstance(value, Exception): errors.setdefault((u, s), value)
+            else: self._remember(u, s, k, value)
+        with self._lock:
+            return {(u, s): errors[(u, s)] if (u, s) in errors else (self._known[(u, s, 'role')][1], self._known[(u, s, 'mode')][1]) for u, s in pairs}
+
+    def plan(self, desired:dict[tuple[str|int, int], tuple[Role|None, Mode|None]]) -> list[AccessChange]:
+        """
+        Work out which users need a new role or ftp access without changing anything. A pair whose access could not be read is returned as a change with no role or mode and the error in its errors.
+
+        :param desired: The access each user should have on each server {(USER, SERVER_ID): (ROLE, MODE)}. None removes the role or access
+        :type desired: dict[tuple[str|int, int], tuple[Role|None, Mode|None]]
+        :return: The changes needed
+        :rtype: list[AccessChange]
+        """
+        ids = self.user_ids([user for user, _ in desired.keys()])
+        pairs = {(ids[user], int(server_id)): (user, value) for (user, server_id), value in desired.items()}
+        current = self.current(list(pairs.keys()))
+        changes = []
+        for (user_id, server_id), (user, (role, mode)) in pairs.items():
+            have = current[(user_id, server_id)]
+            if isinstance(have, Exception):
+                change = AccessChange(user, user_id, server_id, None, None)
+                change.errors.append(have)
+                changes.append(change)
+                continue
+            have_role, have_mode = have
+            change = AccessChange(user, user_id, server_id, None if role == have_role else (have_role, role), None if mode == have_mode else (have_mode, mode))
+            if change.role is not None or change.mode is not None: changes.append(change)
+        return changes
+
+    def apply(self, desired:dict|list[AccessChange], dry_run:bool=False) -> list[AccessChange]:
+        """
+        Set only the roles and ftp access that differ. Calls are made concurrently and a failed call is added to the errors of its change. Changes that already failed are skipped.
+
+        :param desired: The access each user should have on each server {(USER, SERVER_ID): (ROLE, MODE)}, or a plan from plan()
+        :type desired: dict|list[AccessChange]
+        :param dry_run: Only work out the changes, defaults to False
+        :type dry_run: bool, optional
+        :return: The changes
+        :rtype: list[AccessChange]
+        """
+        changes = self.plan(desired) if isinstance(desired, dict) else desired
+        if dry_run: return changes
+        calls = []
+        for x in changes:
+            if not x.ok: continue
+            if x.role is not None: calls.append((x, lambda x=x: self.api.set_user_role(x.user_id, x.server_id, x.role[1])))
+            if x.mode is not None: calls.append((x, lambda x=x: self.api.set_user_ftp_access(x.user_id, x.server_id, x.mode[1])))
+        results = self.api.bulk(lambda fn: fn(), [fn for _, fn in calls], self.max_workers, True)
+        for (change, _), res in zip(calls, results):
+            if isinstance(res, Exception): change.errors.append(res)
+        return changes
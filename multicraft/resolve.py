@@ -0,0 +1,179 @@
+"""
+Remember user and player name to id lookups
+"""
+from collections import OrderedDict
+import shelve
+import threading
+
+__all__ = ['NameResolver']
+
+class NameResolver:
+    def __init__(self, api, max_size:int=4096, store=None, max_workers:int=8):
+        """
+        Create a new resolver. Ids are kept in memory (least recently used names are dropped first) and optionally in a persistent store that survives restarts.
+
+        resolver = NameResolver(api, store='names.db')
+        owner = resolver.user_id(api.user)
+
+        :param api: The client used for lookups
+        :type api: MulticraftAPI
+        :param max_size: The number of names kept in memory, defaults to 4096
+        :type max_size: int, optional
+        :param store: A file name for a shelve database, or any dict-like object, defaults to None
+        :type store: str|MutableMapping, optional
+        :param max_workers: The maximum number of lookups in flight, defaults to 8
+        :type max_workers: int, optional
+        """
+        self.api = api
+        self.max_size = max(1, int(max_size))
+        self.max_workers = int(max_workers)
+        self.store = shelve.open(store) if isinstance(store, str) else store
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.RLock()
+        api.add_listener(self._on_call)
+
+    def __repr__(self):
+        return f"NameResolver(cached={len(self._cache)})"
+
+    def close(self):
+        """
+        Stop listening to the client and close the store
+        """
+        self.api.remove_listener(self._on_call)
+        if hasattr(self.store, 'close'): self.store.close()
+
+    # Internal
+
+    @staticmethod
+    def _user_key(name:str) -> str:
+        return f"user:{name}"
+
+    @staticmethod
+    def _player_key(server_id:int, name:str) -> str:
+        return f"player:{int(server_id)}:{name}"
+
+    def _get(self, key:str) -> int|None:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            if self.store is None or key not in self.store: return None
+            value = int(self.store[key])
+            self._put(key, value, False)
+            return value
+
+    def _put(self, key:str, value:int, persist:bool=True):
+        with self._lock:
+            self._cache[key] = int(value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size: self._cache.popitem(last=False)
+            if persist and self.store is not None: self.store[key] = int(value)
+
+    def _drop(self, key:str):
+        with self._lock:
+            self._cache.pop(key, None)
+            if self.store is not None and key in self.store: del self.store[key]
+
+    def _on_call(self, method:str, params:dict, result):
+        if method == 'createPlayer':
+            self._put(self._player_key(params['server_id'], params['name']), result['id'])
+        elif method == 'deletePlayer' or (method == 'updatePlayer' and 'name' in params.get('field', [])):
+            player_id = int(params['id'])
+            with self._lock:
+                keys = [k for k, v in self._cache.items() if k.startswith('player:') and v == player_id]
+                if self.store is not None: keys += [k for k in self.store.keys() if k.startswith('player:') and int(self.store[k]) == player_id]
+                for key in set(keys): self._drop(key)
+
+    # Users
+
+    def user_id(self, name:str) -> int:
+        """
+        Get the id of a user
+
+        :param name: The name of the user
+        :type name: str
+        :return: The id of the user
+        :rtype: int
+        """
+        return self.user_ids([name])[str(name)]
+
+    def user_ids(self, names:list[str], return_exceptions:bool=False) -> dict[str, int]:
+        """
+        Get the id of many users. Names that are not known are looked up concurrently.
+
+        :param names: The names of the users
+        :type names: list[str]
+        :param return_exceptions: Return exceptions in place of ids instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :return: The id of each user {NAME: ID}
+        :rtype: dict[str, int]
+        """
+        res = {str(x): self._get(self._user_key(x)) for x in names}
+        misses = [k for k, v in res.items() if v is None]
+        for name, user_id in zip(misses, self.api.bulk('get_user_id', misses, self.max_workers, return_exceptions)):
+            if not isinstance(user_id, Exception): self._put(self._user_key(name), user_id)
+            res[name] = user_id if isinstance(user_id, Exception) else int(user_id)
+        return res
+
+    # Players
+
+    def player_id(self, server_id:int, name:str) -> int|None:
+        """
+        Get the id of a player on a server
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :param name: The name of the player
+        :type name: str
+        :return: The id of the player, None if there is no such player
+        :rtype: int|None
+        """
+        return self.player_ids(server_id, [name])[str(name)]
+
+    def player_ids(self, server_id:int, names:list[str], return_exceptions:bool=False) -> dict[str, int|None]:
+        """
+        Get the id of many players on a server. Names that are not known are looked up concurrently with find_players.
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :param names: The names of the players
+        :type names: list[str]
+        :param return_exceptions: Return exceptions in place of ids instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :return: The id of each player {NAME: ID}, None if there is no such player
+        :rtype: dict[str, int|None]
+        """
+        res = {str(x): self._get(self._player_key(server_id, x)) for x in names}
+        misses = [k for k, v in res.items() if v is None]
+        found = self.api.bulk(lambda name: self.api.find_players(server_id, ['name'], [name]), misses, self.max_workers, return_exceptions)
+        for name, players in zip(misses, found):
+            if isinstance(players, Exception):
+                res[name] = players
+                continue
+            # find_players matches partial names, only keep an exact match
+            ids = [int(k) for k, v in players.items() if v == name]
+            res[name] = min(ids) if len(ids) > 0 else None
+            if res[name] is not None: self._put(self._player_key(server_id, name), res[name])
+        return res
+
+    # Invalidation
+
+    def forget(self, name:str, server_id:int=None):
+        """
+        Forget a user, or a player if server_id is given
+
+        :param name: The name of the user or player
+        :type name: str
+        :param server_id: The id of the server the player is on, defaults to None
+        :type server_id: int, optional
+        """
+        self._drop(self._user_key(name) if server_id is None else self._player_key(server_id, name))
+
+    def clear(self):
+        """
+        Forget every name, including the persistent store
+        """
+        with self._lock:
+            self._cache.clear()
+            if self.store is not None:
+                for key in list(self.store.keys()): del self.store[key]
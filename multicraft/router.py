@@ -0,0 +1,264 @@
+"""
+Route calls to the right panel when servers are spread across several hosts
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import threading
+
+from . import MulticraftException, MulticraftTimeout
+
+__all__ = ['MulticraftRouter']
+
+log = logging.getLogger(__name__)
+
+class MulticraftRouter:
+    def __init__(self, panels:dict=None, max_workers:int=8):
+        """
+        Create a new router. Each panel is a separate MulticraftAPI with its own key, connection pool and rate limit.
+
+        Servers are routed by id alone. Each panel numbers its servers on its own, so when two panels report the same id discover() routes it to neither and lists it in ambiguous(). Call route() to pick a panel for it, routes set by hand are kept by discover().
+
+        router = MulticraftRouter({'apex': MulticraftAPI(APEX_PANEL, 'user', 'key', rate_limit=5)})
+        router.discover()
+        router.for_server(1234).start_server(1234)
+
+        :param panels: The clients for each panel {NAME: MulticraftAPI}, defaults to None
+        :type panels: dict[str, MulticraftAPI], optional
+        :param max_workers: The maximum number of panels called at once, defaults to 8
+        :type max_workers: int, optional
+        """
+        self.panels = {}
+        self.max_workers = int(max_workers)
+        self._routes: dict[int, str] = {}
+        self._ambiguous: dict[int, set[str]] = {}
+        self._pinned: set[int] = set()
+        self._lock = threading.Lock()
+        for name, api in ({} if panels is None else panels).items(): self.add_panel(name, api)
+
+    def __repr__(self):
+        return f"MulticraftRouter(panels={list(self.panels.keys())}, servers={len(self._routes)})"
+
+    # Panels
+
+    def add_panel(self, name:str, api):
+        """
+        Add a panel
+
+        :param name: The name of the panel
+        :type name: str
+        :param api: The client for this panel
+        :type api: MulticraftAPI
+        :return: This router
+        :rtype: MulticraftRouter
+        """
+        self.panels[str(name)] = api
+        return self
+
+    def remove_panel(self, name:str):
+        """
+        Remove a panel and every server routed to it
+
+        :param name: The name of the panel
+        :type name: str
+        :return: This router
+        :rtype: MulticraftRouter
+        """
+        self.panels.pop(str(name), None)
+        with self._lock:
+            self._routes = {k: v for k, v in self._routes.items() if v != str(name)}
+            self._pinned &= set(self._routes.keys())
+            for server_id in list(self._ambiguous.keys()):
+                self._ambiguous[server_id].discard(str(name))
+                if len(self._ambiguous[server_id]) < 2: del self._ambiguous[server_id]
+        return self
+
+    # Routes
+
+    def route(self, server_id:int, panel:str):
+        """
+        Route this server to a panel. discover() keeps this route even if other panels report the same id
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :param panel: The name of the panel
+        :type panel: str
+        :return: This router
+        :rtype: MulticraftRouter
+        """
+        if str(panel) not in self.panels: raise MulticraftException(f"Unknown panel '{panel}'")
+        with self._lock:
+            self._routes[int(server_id)] = str(panel)
+            self._pinned.add(int(server_id))
+            self._ambiguous.pop(int(server_id), None)
+        return self
+
+    def routes(self) -> dict[int, str]:
+        """
+        Get every known server and its panel
+
+        :return: The routes {SERVER_ID: PANEL}
+        :rtype: dict[int, str]
+        """
+        with self._lock:
+            return dict(self._routes)
+
+    def ambiguous(self) -> dict[int, list[str]]:
+        """
+        Get the servers discover() did not route because more than one panel has a server with that id
+
+        :return: The panels of each server {SERVER_ID: [PANEL]}
+        :rtype: dict[int, list[str]]
+        """
+        with self._lock:
+            return {k: sorted(v) for k, v in self._ambiguous.items()}
+
+    def panel_of(self, server_id:int) -> str:
+        """
+        Get the name of the panel this server is on
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The name of the panel
+        :rtype: str
+        """
+        with self._lock:
+            panel = self._routes.get(int(server_id))
+            panels = self._ambiguous.get(int(server_id))
+        if panels is not None: raise MulticraftException(f"Server {server_id} exists on panels {sorted(panels)}, route it to one of them first")
+        if panel is None: raise MulticraftException(f"Unknown server {server_id}, route it or call discover() first")
+        return panel
+
+    def for_server(self, server_id:int):
+        """
+        Get the client of the panel this server is on
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The client
+        :rtype: MulticraftAPI
+        """
+        return self.panels[self.panel_of(server_id)]
+
+    def call(self, method:str, server_id:int, *args, **kw):
+        """
+        Call a method on the panel this server is on. The server id is passed as the first argument.
+
+        :param method: The name of the method, for example "get_server_status"
+        :type method: str
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The result
+        :rtype: Any
+        """
+        return getattr(self.for_server(server_id), method)(server_id, *args, **kw)
+
+    def health(self) -> dict[str, float]:
+        """
+        Get the health score of each panel between 0 (down) and 1 (healthy). Panels without a circuit breaker are reported as 1
+
+        :return: The health of each panel {NAME: SCORE}
+        :rtype: dict[str, float]
+        """
+        return {k: 1.0 if v.circuit_breaker is None else v.circuit_breaker.health for k, v in self.panels.items()}
+
+    # Fan out
+
+    def fan_out(self, fn, timeout:float=None, panels:list[str]=None) -> dict:
+        """
+        Call fn(api) on every panel in parallel. A slow panel does not hold up the others, if the timeout passes its result is a MulticraftTimeout.
+
+        :param fn: The function to call with each client, or the name of a method to call without arguments
+        :type fn: Callable|str
+        :param timeout: The maximum seconds to wait for all panels, defaults to None
+        :type timeout: float, optional
+        :param panels: The names of the panels to call, defaults to every panel
+        :type panels: list[str], optional
+        :return: The result or exception of each panel {NAME: RESULT}
+        :rtype: dict
+        """
+        if isinstance(fn, str):
+            name = fn
+            fn = lambda api: getattr(api, name)()
+        names = list(self.panels.keys()) if panels is None else [str(x) for x in panels]
+        return self._fan_out({x: (lambda api=self.panels[x]: fn(api)) for x in names}, timeout)
+
+    def _fan_out(self, calls:dict, timeout:float=None) -> dict:
+        if len(calls) == 0: return {}
+        pool = ThreadPoolExecutor(max(1, min(self.max_workers, len(calls))), thread_name_prefix='multicraft-router')
+        futures = {pool.submit(fn): x for x, fn in calls.items()}
+        done, _ = wait(futures, timeout)
+        pool.shutdown(wait=False, cancel_futures=True)
+        res = {}
+        for future, name in futures.items():
+            if future not in done: res[name] = MulticraftTimeout(f"Panel '{name}' did not answer within {timeout}s")
+            elif future.exception() is not None: res[name] = future.exception()
+            else: res[name] = future.result()
+        return res
+
+    def discover(self, timeout:float=None) -> dict[int, str]:
+        """
+        Find every server owned by each panel's user and route it to that panel. Ids reported by more than one panel are not routed, see ambiguous()
+
+        :param timeout: The maximum seconds to wait for all panels, defaults to None
+        :type timeout: float, optional
+        :return: The routes {SERVER_ID: PANEL}
+        :rtype: dict[int, str]
+        """
+        self.list_servers(timeout)
+        return self.routes()
+
+    def list_servers(self, timeout:float=None) -> dict[str, str]:
+        """
+        Get every server owned by each panel's user, merged into one dict, and route them. Ids reported by more than one panel are not routed, see ambiguous()
+
+        :param timeout: The maximum seconds to wait for all panels, defaults to None
+        :type timeout: float, optional
+        :return: The servers {ID: NAME}. Panels that failed are skipped, for an ambiguous id the name is from one of its panels
+        :rtype: dict[str, str]
+        """
+        found = {k: v for k, v in self.fan_out(lambda api: api.list_servers_by_owner(api.get_user_id(api.user)), timeout).items() if not isinstance(v, Exception)}
+        res, panels = {}, {}
+        for panel, servers in found.items():
+            for server_id in servers.keys(): panels.setdefault(int(server_id), set()).add(panel)
+            res.update(servers)
+        with self._lock:
+            for server_id, names in panels.items():
+                if server_id in self._pinned: continue
+                # Panels that did not answer this time still count
+                names |= {x for x in self._ambiguous.get(server_id, {self._routes.get(server_id)}) if x is not None and x not in found and x in self.panels}
+                if len(names) > 1:
+                    self._routes.pop(server_id, None)
+                    self._ambiguous[server_id] = names
+                else:
+                    self._routes[server_id] = names.pop()
+                    self._ambiguous.pop(server_id, None)
+            ambiguous = {k: sorted(v) for k, v in self._ambiguous.items() if k in panels}
+        if len(ambiguous) > 0: log.warning(f"Not routing {len(ambiguous)} server ids found on more than one panel: {ambiguous}")
+        return res
+
+    def bulk(self, method:str, server_ids:list[int], *args, max_workers:int=8, return_exceptions:bool=False) -> list:
+        """
+        Call a method once for every server. Servers are grouped by panel and each panel is called in parallel.
+
+        :param method: The name of the method, for example "get_server_status"
+        :type method: str
+        :param server_ids: The ids of the servers
+        :type server_ids: list[int]
+        :param max_workers: The maximum number of calls in flight on each panel, defaults to 8
+        :type max_workers: int, optional
+        :param return_exceptions: Return exceptions in place of results instead of raising the first one, defaults to False
+        :type return_exceptions: bool, optional
+        :return: The results in the same order as server_ids
+        :rtype: list
+        """
+        server_ids = [int(x) for x in server_ids]
+        groups = {}
+        for server_id in server_ids: groups.setdefault(self.panel_of(server_id), []).append(server_id)
+        calls = {panel: (lambda api=self.panels[panel], ids=ids: api.bulk(method, [(x, *args) for x in ids], max_workers, return_exceptions)) for panel, ids in groups.items()}
+        merged = {}
+        for panel, results in self._fan_out(calls).items():
+            if isinstance(results, Exception):
+                if not return_exceptions: raise results
+                results = [results] * len(groups[panel])
+            merged.update(zip(groups[panel], results))
+        return [merged[x] for x in server_ids]
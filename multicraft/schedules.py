@@ -0,0 +1,413 @@
+"""
+Client-side schedule index ordered by next run time
+"""
+import copy
+import datetime
+import threading
+import heapq
+import json
+import math
+import time
+
+from . import Schedule, ScheduleStatus
+
+__all__ = ['ScheduleIndex', 'ScheduleChange', 'SpreadPlan', 'plan_spread']
+
+FIELDS = {
+    'name': 'name',
+    'ts': 'scheduled_ts',
+    'scheduled_ts': 'scheduled_ts',
+    'interval': 'interval',
+    'cmd': 'command',
+    'command': 'command',
+    'for': 'run_for',
+    'run_for': 'run_for',
+    'status': 'status',
+    'args': 'args',
+    'hidden': 'hidden'
+}
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime.datetime): return value.timestamp()
+    return float(value or 0)
+
+def _list(value) -> list:
+    if isinstance(value, str):
+        try: return json.loads(value)
+        except ValueError: return [value]
+    return list(value)
+
+class ScheduleIndex:
+    def __init__(self, api, topology=None, listen:bool=True):
+        """
+        Create a new schedule index. Schedules are kept in a heap ordered by their next run time, recurring schedules are rescheduled by their interval.
+
+        :param api: The client used to fetch schedules
+        :type api: MulticraftAPI
+        :param topology: Used to group schedules by daemon for collision detection, defaults to looking up the daemon of each server with get_server
+        :type topology: ServerTopology, optional
+        :param listen: Update the index when create_schedule, update_schedule and delete_schedule go through the client, defaults to True
+        :type listen: bool, optional
+        """
+        self.api = api
+        self.topology = topology
+        self._schedules: dict[int, Schedule] = {}
+        self._versions: dict[int, int] = {}
+        self._daemons: dict[int, int|None] = {}
+        self._heap = []
+        self._lock = threading.RLock()
+        if listen: api.add_listener(self._on_call)
+
+    def __repr__(self):
+        return f"ScheduleIndex(schedules={len(self._schedules)})"
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def close(self):
+        """
+        Stop listening to the client
+        """
+        self.api.remove_listener(self._on_call)
+
+    # Internal
+
+    def next_run(self, schedule:Schedule, now:float=None) -> float|None:
+        """
+        Get the next time this schedule runs
+
+        :param schedule: The schedule
+        :type schedule: Schedule
+        :param now: The epoch time to look from, defaults to time.time()
+        :type now: float, optional
+        :return: The epoch time of the next run, None if it will not run again
+        :rtype: float|None
+        """
+        if now is None: now = time.time()
+        if schedule.status in (ScheduleStatus.done, ScheduleStatus.paused): return None
+        ts = _timestamp(schedule.scheduled_ts)
+        if ts >= now: return ts
+        if schedule.interval <= 0: return None
+        return ts + math.ceil((now - ts) / schedule.interval) * schedule.interval
+
+    def _push(self, schedule:Schedule):
+        ts = self.next_run(schedule)
+        version = self._versions.get(schedule.id, 0) + 1
+        self._versions[schedule.id] = version
+        self._schedules[schedule.id] = schedule
+        if ts is not None: heapq.heappush(self._heap, (ts, schedule.id, version))
+
+    def _on_call(self, method:str, params:dict, result):
+        if method == 'createSchedule':
+            self.add(Schedule(result['id'], **params))
+        elif method == 'updateSchedule':
+            schedule_id = int(params['id'])
+            fields, values = _list(params.get('field', [])), _list(params.get('value', []))
+            if schedule_id not in self._schedules: return
+            if all(x in FIELDS for x in fields):
+                # Callers may hold the indexed schedule, so the update goes on a copy
+                schedule = copy.copy(self._schedules[schedule_id])
+                try:
+                    for field, value in zip(fields, values): setattr(schedule, FIELDS[field], value)
+                except (TypeError, ValueError):
+                    self.refresh(schedule_id)
+                    return
+                with self._lock: self._push(schedule)
+            else: self.refresh(schedule_id)
+        elif method == 'deleteSchedule':
+            self.remove(int(params['id']))
+
+    # Updates
+
+    def load(self, server_ids:list[int], max_workers:int=8) -> int:
+        """
+        Fetch every schedule of these servers
+
+        :param server_ids: The ids of the servers
+        :type server_ids: list[int]
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        :return: The number of schedules loaded
+        :rtype: int
+        """
+        ids = [int(x) for res in self.api.bulk('list_schedules', [int(x) for x in server_ids], max_workers) for x in res.keys()]
+        schedules = self.api.bulk('get_schedule', ids, max_workers)
+        for schedule in schedules: self.add(schedule)
+        return len(schedules)
+
+    def load_daemons(self, server_ids:list[int], max_workers:int=8):
+        """
+        Fetch the daemon of each server that is not in the topology and has not been looked up yet
+
+        :param server_ids: The ids of the servers
+        :type server_ids: list[int]
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        """
+        ids = dict.fromkeys(int(x) for x in server_ids)
+        if self.topology is not None: ids = [x for x in ids if self.topology.daemon_of(x) is None]
+        with self._lock: missing = [x for x in ids if x not in self._daemons]
+        servers = self.api.bulk('get_server', missing, max_workers)
+        with self._lock:
+            for server_id, server in zip(missing, servers):
+                try: self._daemons[server_id] = int(server.daemon_id)
+                except (TypeError, ValueError): self._daemons[server_id] = None
+
+    def add(self, schedule:Schedule):
+        """
+        Add or replace a schedule
+
+        :param schedule: The schedule
+        :type schedule: Schedule
+        """
+        with self._lock: self._push(schedule)
+
+    def remove(self, schedule_id:int):
+        """
+        Remove a schedule
+
+        :param schedule_id: The id of the schedule
+        :type schedule_id: int
+        """
+        with self._lock:
+            self._schedules.pop(int(schedule_id), None)
+            self._versions.pop(int(schedule_id), None)
+
+    def refresh(self, schedule_id:int) -> Schedule:
+        """
+        Fetch this schedule again
+
+        :param schedule_id: The id of the schedule
+        :type schedule_id: int
+        :return: The schedule
+        :rtype: Schedule
+        """
+        schedule = self.api.get_schedule(schedule_id)
+        self.add(schedule)
+        return schedule
+
+    # Queries
+
+    def get(self, schedule_id:int) -> Schedule|None:
+        """
+        Get a schedule by id
+
+        :param schedule_id: The id of the schedule
+        :type schedule_id: int
+        :return: The schedule, None if it is not indexed
+        :rtype: Schedule|None
+        """
+        return self._schedules.get(int(schedule_id))
+
+    def schedules(self) -> list[Schedule]:
+        """
+        Get every indexed schedule
+
+        :return: The schedules
+        :rtype: list[Schedule]
+        """
+        with self._lock: return list(self._schedules.values())
+
+    def peek(self) -> tuple[float, Schedule]|None:
+        """
+        Get the schedule that runs next
+
+        :return: The epoch time and schedule, None if nothing is scheduled
+        :rtype: tuple[float, Schedule]|None
+        """
+        now = time.time()
+        with self._lock:
+            while len(self._heap) > 0:
+                ts, schedule_id, version = self._heap[0]
+                if self._versions.get(schedule_id) != version:
+                    heapq.heappop(self._heap)
+                    continue
+                if ts < now:
+                    # Already ran, move it to its next run
+                    heapq.heappop(self._heap)
+                    self._push(self._schedules[schedule_id])
+                    continue
+                return ts, self._schedules[schedule_id]
+        return None
+
+    def due(self, start:float|datetime.datetime, end:float|datetime.datetime) -> list[tuple[float, Schedule]]:
+        """
+        Get every run between these times, recurring schedules appear once for each run
+
+        :param start: The epoch time or datetime to start from
+        :type start: float|datetime.datetime
+        :param end: The epoch time or datetime to end at
+        :type end: float|datetime.datetime
+        :return: The runs ordered by time [(TIME, SCHEDULE)]
+        :rtype: list[tuple[float, Schedule]]
+        """
+        start, end = _timestamp(start), _timestamp(end)
+        with self._lock:
+            heap = [(ts, x.id, x) for x in self._schedules.values() if (ts := self.next_run(x, start)) is not None and ts <= end]
+        heapq.heapify(heap)
+        res = []
+        while len(heap) > 0:
+            ts, schedule_id, schedule = heapq.heappop(heap)
+            res.append((ts, schedule))
+            if schedule.interval > 0 and ts + schedule.interval <= end: heapq.heappush(heap, (ts + schedule.interval, schedule_id, schedule))
+        return res
+
+    def daemon_of(self, schedule:Schedule):
+        """
+        Get the daemon this schedule runs on, from the topology or else from get_server. Servers are only looked up once.
+
+        :param schedule: The schedule
+        :type schedule: Schedule
+        :return: The daemon id, None if the panel does not say
+        :rtype: int|None
+        """
+        server_id = int(schedule.server_id)
+        if self.topology is not None:
+            daemon = self.topology.daemon_of(server_id)
+            if daemon is not None: return daemon
+        with self._lock:
+            if server_id in self._daemons: return self._daemons[server_id]
+        self.load_daemons([server_id])
+        return self._daemons.get(server_id)
+
+    def collisions(self, start:float|datetime.datetime, end:float|datetime.datetime, limit:int=3, window:int=60) -> dict[tuple, list[Schedule]]:
+        """
+        Find windows where more than limit schedules run on the same daemon
+
+        :param start: The epoch time or datetime to start from
+        :type start: float|datetime.datetime
+        :param end: The epoch time or datetime to end at
+        :type end: float|datetime.datetime
+        :param limit: The number of schedules a daemon can run in one window, defaults to 3
+        :type limit: int, optional
+        :param window: The size of a window in seconds, defaults to 60
+        :type window: int, optional
+        :return: The schedules that run in each crowded window {(DAEMON, WINDOW_START): [SCHEDULE]}
+        :rtype: dict[tuple, list[Schedule]]
+        """
+        buckets = {}
+        runs = self.due(start, end)
+        self.load_daemons([x.server_id for _, x in runs])
+        for ts, schedule in runs:
+            key = (self.daemon_of(schedule), int(ts // window * window))
+            buckets.setdefault(key, []).append(schedule)
+        return {k: v for k, v in buckets.items() if len(v) > limit}
+
+class ScheduleChange:
+    def __init__(self, schedule:Schedule, daemon, old_run:float, new_run:float):
+        self.schedule = schedule
+        self.daemon = daemon
+        self.old_run = old_run
+        self.new_run = new_run
+
+    def __repr__(self):
+        return f"ScheduleChange(id={self.schedule.id}, offset={self.offset})"
+
+    def __str__(self) -> str:
+        old = datetime.datetime.fromtimestamp(self.old_run).strftime('%Y-%m-%d %H:%M:%S')
+        new = datetime.datetime.fromtimestamp(self.new_run).strftime('%H:%M:%S')
+        return f"Schedule {self.schedule.id} '{self.schedule.name}' (server {self.schedule.server_id}, daemon {self.daemon}): {old} -> {new} (+{self.offset}s)"
+
+    @property
+    def offset(self) -> int:
+        """
+        The number of seconds the schedule moves by
+        """
+        return int(self.new_run - self.old_run)
+
+    @property
+    def scheduled_ts(self) -> int:
+        """
+        The new scheduled_ts. Recurring schedules keep their interval, only their phase moves.
+        """
+        return int(_timestamp(self.schedule.scheduled_ts)) + self.offset
+
+class SpreadPlan:
+    def __init__(self, changes:list[ScheduleChange], unplaced:list[Schedule], before:dict, after:dict):
+        self.changes = changes
+        self.unplaced = unplaced
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return f"SpreadPlan(changes={len(self.changes)}, unplaced={len(self.unplaced)}, peak={self.peak(self.before)}->{self.peak(self.after)})"
+
+    def __str__(self) -> str:
+        return self.diff()
+
+    @staticmethod
+    def peak(profile:dict) -> int:
+        """
+        The highest number of schedules in one slot on one daemon
+        """
+        return max(profile.values(), default=0)
+
+    def diff(self) -> str:
+        """
+        Describe every change without applying it
+
+        :return: One line per change
+        :rtype: str
+        """
+        lines = [str(x) for x in self.changes]
+        lines += [f"Schedule {x.id} '{x.name}' (server {x.server_id}): no free slot in the window" for x in self.unplaced]
+        lines.append(f"Peak load per slot: {self.peak(self.before)} -> {self.peak(self.after)}")
+        return '\n'.join(lines)
+
+    def apply(self, api, max_workers:int=8, return_exceptions:bool=True) -> list:
+        """
+        Move every schedule with update_schedule. Calls are made concurrently, use diff() to review the changes first.
+
+        :param api: The client to use
+        :type api: MulticraftAPI
+        :param max_workers: The maximum number of calls in flight, defaults to 8
+        :type max_workers: int, optional
+        :param return_exceptions: Return exceptions in place of results instead of raising the first one, defaults to True
+        :type return_exceptions: bool, optional
+        :return: The result of each update in the same order as changes
+        :rtype: list
+        """
+        return api.bulk('update_schedule', [(x.schedule.id, ['scheduled_ts'], [str(x.scheduled_ts)]) for x in self.changes], max_workers, return_exceptions)
+
+def plan_spread(index:ScheduleIndex, start:float|datetime.datetime=None, end:float|datetime.datetime=None, window:int=3600, slot:int=60, capacity:int=2) -> SpreadPlan:
+    """
+    Work out new start times so no daemon runs more than capacity schedules in the same slot. Each schedule may only move later, by at most window seconds.
+
+    :param index: The loaded schedule index
+    :type index: ScheduleIndex
+    :param start: Only move runs from this time, defaults to now
+    :type start: float|datetime.datetime, optional
+    :param end: Only move runs up to this time, defaults to 24 hours after start
+    :type end: float|datetime.datetime, optional
+    :param window: The most seconds a schedule may be moved by, defaults to 3600
+    :type window: int, optional
+    :param slot: The size of a slot in seconds, defaults to 60
+    :type slot: int, optional
+    :param capacity: The number of schedules a daemon can run in one slot, defaults to 2
+    :type capacity: int, optional
+    :return: The plan, use plan.diff() to review it and plan.apply(api) to apply it
+    :rtype: SpreadPlan
+    """
+    start = time.time() if start is None else _timestamp(start)
+    end = start + 86400 if end is None else _timestamp(end)
+    runs = []
+    for schedule in index.schedules():
+        ts = index.next_run(schedule, start)
+        if ts is not None and ts <= end: runs.append((ts, schedule.id, schedule))
+    runs.sort(key=lambda x: x[:2])
+    index.load_daemons([x[2].server_id for x in runs])
+    before, after = {}, {}
+    changes, unplaced = [], []
+    for ts, _, schedule in runs:
+        daemon = index.daemon_of(schedule)
+        first = int(ts // slot)
+        before[(daemon, first)] = before.get((daemon, first), 0) + 1
+        for bucket in range(first, int((ts + window) // slot) + 1):
+            if after.get((daemon, bucket), 0) < capacity: break
+        else:
+            unplaced.append(schedule)
+            after[(daemon, first)] = after.get((daemon, first), 0) + 1
+            continue
+        after[(daemon, bucket)] = after.get((daemon, bucket), 0) + 1
+        if bucket != first: changes.append(ScheduleChange(schedule, daemon, ts, bucket * slot + ts % slot))
+    return SpreadPlan(changes, unplaced, before, after)
@@ -0,0 +1,222 @@
+"""
+Immutable, hashable snapshots of models that can be shared between threads without copying
+"""
+from enum import Enum
+from typing import NamedTuple
+import datetime
+
+from . import MulticraftException
+from .model import Status, ScheduleStatus, BackupStatus, User, Server, Command, ServerStatus, ServerResources, ChatMessage, Player, Schedule, Database, Backup
+
+__all__ = ['UserSnapshot', 'ServerSnapshot', 'CommandSnapshot', 'ServerStatusSnapshot', 'ServerResourcesSnapshot', 'ChatMessageSnapshot', 'PlayerSnapshot', 'ScheduleSnapshot', 'DatabaseSnapshot', 'BackupSnapshot', 'freeze']
+
+def _thaw(cls:type, snapshot:tuple, api=None):
+    obj = cls.__new__(cls)
+    attrs = obj.__dict__
+    for name, value in zip(snapshot._fields, snapshot):
+        if value is None: continue
+        attrs['_run' if name == 'console_command' else f"_{name}"] = list(value) if isinstance(value, tuple) else value
+    if api is not None: obj.bind(api)
+    return obj
+
+class UserSnapshot(NamedTuple):
+    id: int
+    name: str
+    email: str
+    global_role: str
+    lang: str
+    theme: str
+    gauth_secret: str
+    gauth_token: str
+    timezone: str
+
+    def thaw(self) -> User:
+        """
+        Get a mutable copy of this user
+        """
+        return _thaw(User, self)
+
+class ServerSnapshot(NamedTuple):
+    id: int
+    name: str
+    daemon_id: str
+    ip: str
+    port: int
+    players: int
+    memory: int
+
+    def thaw(self, api=None) -> Server:
+        """
+        Get a mutable copy of this server
+
+        :param api: Bind it to this client, defaults to None
+        :type api: MulticraftAPI, optional
+        """
+        return _thaw(Server, self, api)
+
+class CommandSnapshot(NamedTuple):
+    id: int
+    name: str
+    server_id: int
+    level: int
+    prereq: int
+    chat: str
+    response: str
+    console_command: str
+    hidden: bool
+
+    def thaw(self, api=None) -> Command:
+        """
+        Get a mutable copy of this command
+
+        :param api: Bind it to this client, defaults to None
+        :type api: MulticraftAPI, optional
+        """
+        return _thaw(Command, self, api)
+
+class ServerStatusSnapshot(NamedTuple):
+    status: Status
+    online_players: int
+    max_players: int
+    players: tuple[str, ...]
+
+    def thaw(self) -> ServerStatus:
+        """
+        Get a mutable copy of this status
+        """
+        return _thaw(ServerStatus, self)
+
+class ServerResourcesSnapshot(NamedTuple):
+    cpu: float
+    memory: float
+    quota: int
+
+    def thaw(self) -> ServerResources:
+        """
+        Get a mutable copy of these resources
+        """
+        return _thaw(ServerResources, self)
+
+class ChatMessageSnapshot(NamedTuple):
+    text: str
+    name: str
+    time: datetime.datetime
+
+    def thaw(self) -> ChatMessage:
+        """
+        Get a mutable copy of this message
+        """
+        return _thaw(ChatMessage, self)
+
+class PlayerSnapshot(NamedTuple):
+    id: int
+    name: str
+    server_id: int
+    level: int
+    lastseen: datetime.datetime
+    banned: bool
+    op: bool
+    status: Status
+    ip: str
+    previps: str
+    quitreason: str
+
+    def thaw(self, api=None) -> Player:
+        """
+        Get a mutable copy of this player
+
+        :param api: Bind it to this client, defaults to None
+        :type api: MulticraftAPI, optional
+        """
+        return _thaw(Player, self, api)
+
+class ScheduleSnapshot(NamedTuple):
+    id: int
+    name: str
+    server_id: int
+    scheduled_ts: datetime.datetime
+    last_run_ts: datetime.datetime
+    interval: int
+    command: int
+    run_for: int
+    status: ScheduleStatus
+    args: str
+    hidden: bool
+
+    def thaw(self, api=None) -> Schedule:
+        """
+        Get a mutable copy of this schedule
+
+        :param api: Bind it to this client, defaults to None
+        :type api: MulticraftAPI, optional
+        """
+        return _thaw(Schedule, self, api)
+
+class DatabaseSnapshot(NamedTuple):
+    server_id: int
+    host: str
+    name: str
+    username: str
+    password: str
+    link: str
+
+    def thaw(self, api=None) -> Database:
+        """
+        Get a mutable copy of this database
+
+        :param api: Bind it to this client, defaults to None
+        :type api: MulticraftAPI, optional
+        """
+        return _thaw(Database, self, api)
+
+class BackupSnapshot(NamedTuple):
+    status: BackupStatus
+    ftp: str
+    message: str
+    file: str
+    time: datetime.datetime
+
+    def thaw(self) -> Backup:
+        """
+        Get a mutable copy of this backup
+        """
+        return _thaw(Backup, self)
+
+SNAPSHOTS = {
+    User: UserSnapshot,
+    Server: ServerSnapshot,
+    Command: CommandSnapshot,
+    ServerStatus: ServerStatusSnapshot,
+    ServerResources: ServerResourcesSnapshot,
+    ChatMessage: ChatMessageSnapshot,
+    Player: PlayerSnapshot,
+    Schedule: ScheduleSnapshot,
+    Database: DatabaseSnapshot,
+    Backup: BackupSnapshot
+}
+
+def freeze(obj):
+    """
+    Get an immutable snapshot of a model. Lists become tuples and dicts get a snapshot of each value, other values are returned as they are.
+
+    status = freeze(api.get_server_status(1, True))
+    status.thaw().max_players = 50
+
+    :param obj: The model, or a list or dict of models
+    :type obj: object
+    :return: The snapshot
+    :rtype: NamedTuple|tuple|dict
+    """
+    if hasattr(obj, '_fields'): return obj
+    if isinstance(obj, (list, tuple)): return tuple(freeze(x) for x in obj)
+    if isinstance(obj, dict): return {k: freeze(v) for k, v in obj.items()}
+    for cls in type(obj).__mro__:
+        snapshot = SNAPSHOTS.get(cls)
+        if snapshot is None: continue
+        values = []
+        for name in snapshot._fields:
+            value = getattr(obj, name, None)
+            values.append(tuple(value) if isinstance(value, list) else value)
+        return snapshot._make(values)
+    if isinstance(obj, (str, int, float, bool, datetime.datetime, Enum)) or obj is None: return obj
+    raise MulticraftException(f"Cannot freeze '{obj.__class__.__name__}'")
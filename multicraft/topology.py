@@ -0,0 +1,152 @@
+"""
+Cached daemon to servers topology built from list_servers_by_connection and get_server
+"""
+import threading
+
+from . import Server
+
+__all__ = ['ServerTopology']
+
+class ServerTopology:
+    def __init__(self, api, connection_ids:list[int]=None):
+        """
+        Create a new daemon to servers topology
+
+        Nothing is fetched until refresh() is called.
+
+        :param api: The client used to fetch servers
+        :type api: MulticraftAPI
+        :param connection_ids: The ids of the connections (daemons) to track, defaults to None
+        :type connection_ids: list[int], optional
+        """
+        self.api = api
+        self.connection_ids = [] if connection_ids is None else [int(x) for x in connection_ids]
+        self._lock = threading.RLock()
+        self._servers: dict[int, Server] = {}
+        self._by_connection: dict[int, set[int]] = {}
+
+    def __repr__(self):
+        return f"ServerTopology(daemons={len(self.daemons())}, servers={len(self._servers)})"
+
+    # Internal
+
+    def _daemon_of(self, server:Server) -> int|None:
+        try: return int(server.daemon_id)
+        except (TypeError, ValueError): return None
+
+    # Refresh
+
+    def refresh(self, connection_ids:list[int]=None) -> dict[int, list[Server]]:
+        """
+        Refresh the topology. Only servers that have not been seen before are fetched with get_server, servers that are no longer listed are dropped.
+
+        :param connection_ids: The ids of the connections to refresh, defaults to all tracked connections
+        :type connection_ids: list[int], optional
+        :return: The servers grouped by daemon id
+        :rtype: dict[int, list[Server]]
+        """
+        if connection_ids is None: connection_ids = self.connection_ids
+        for connection_id in connection_ids:
+            connection_id = int(connection_id)
+            listed = {int(x) for x in self.api.list_servers_by_connection(connection_id).keys()}
+            with self._lock:
+                if connection_id not in self.connection_ids: self.connection_ids.append(connection_id)
+                missing = listed - self._servers.keys()
+            fetched = {x: self.api.get_server(x) for x in missing}
+            with self._lock:
+                self._servers.update(fetched)
+                removed = self._by_connection.get(connection_id, set()) - listed
+                self._by_connection[connection_id] = listed
+                for server_id in removed:
+                    if not any(server_id in x for x in self._by_connection.values()):
+                        self._servers.pop(server_id, None)
+        return self.topology()
+
+    def refresh_server(self, server_id:int) -> Server:
+        """
+        Fetch this server again, for example after it has been moved to another daemon
+
+        :param server_id: The id of the server to refresh
+        :type server_id: int
+        :return: The refreshed server
+        :rtype: Server
+        """
+        server = self.api.get_server(int(server_id))
+        with self._lock:
+            self._servers[int(server_id)] = server
+        return server
+
+    def forget(self, server_id:int) -> None:
+        """
+        Remove this server from the topology
+
+        :param server_id: The id of the server to remove
+        :type server_id: int
+        """
+        with self._lock:
+            self._servers.pop(int(server_id), None)
+            for ids in self._by_connection.values(): ids.discard(int(server_id))
+
+    # Lookup
+
+    def topology(self) -> dict[int, list[Server]]:
+        """
+        Get the cached servers grouped by daemon id
+
+        :return: The servers grouped by daemon id
+        :rtype: dict[int, list[Server]]
+        """
+        res = {}
+        with self._lock:
+            for server in self._servers.values():
+                res.setdefault(self._daemon_of(server), []).append(server)
+        return res
+
+    def daemons(self) -> list[int]:
+        """
+        Get the ids of all known daemons
+
+        :return: The daemon ids
+        :rtype: list[int]
+        """
+        return list(self.topology().keys())
+
+    def servers(self, daemon_id:int=None) -> list[Server]:
+        """
+        Get the cached servers
+
+        :param daemon_id: Only return servers on this daemon, defaults to None
+        :type daemon_id: int, optional
+        :return: The cached servers
+        :rtype: list[Server]
+        """
+        with self._lock:
+            if daemon_id is None: return list(self._servers.values())
+            return [x for x in self._servers.values() if self._daemon_of(x) == int(daemon_id)]
+
+    def daemon_of(self, server_id:int) -> int|None:
+        """
+        Get the daemon id of this server
+
+        :param server_id: The id of the server
+        :type server_id: int
+        :return: The daemon id, None if the server is unknown
+        :rtype: int|None
+        """
+        with self._lock:
+            server = self._servers.get(int(server_id))
+        return None if server is None else self._daemon_of(server)
+
+    def group(self, server_ids:list[int]) -> dict[int, list[int]]:
+        """
+        Group these server ids by daemon without making any calls. Unknown servers are grouped under None.
+
+        :param server_ids: The ids of the servers to group
+        :type server_ids: list[int]
+        :return: The server ids grouped by daemon id
+        :rtype: dict[int, list[int]]
+        """
+        res = {}
+        for server_id in server_ids:
+            res.setdefault(self.daemon_of(server_id), []).append(int(server_id))
+        return res
@@ -15,6 +15,9 @@ setuptools.setup(
     url='https://github.com/legopitstop/multicraft-py',
     packages=setuptools.find_packages(),
     install_requires=required_modules,
+    entry_points={
+        'console_scripts': ['multicraft=multicraft.cli:main']
+    },
     license='MIT',
     keywords=['multicraft', 'minecraft', 'minecraftserver', 'server'],
     author_email='officiallegopitstop@gmail.com',
@@ -0,0 +1,48 @@
+"""
+Compare the binary format with pickle and JSON on a list of players
+
+python tests/bench_codec.py [COUNT]
+"""
+import datetime
+import json
+import os
+import pickle
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multicraft import Status, Player, pack_models, iter_unpack_models, to_json
+
+def players(count:int) -> list[Player]:
+    seen = datetime.datetime(2024, 5, 1, 12, 30)
+    return [Player(x, f"player{x}", x % 50, x % 4 * 10, seen, False, x % 20 == 0, Status.online if x % 3 else Status.offline, f"10.0.{x % 256}.{x % 7}", None, 'Quit') for x in range(count)]
+
+def dumps_json(objs:list[Player]) -> bytes:
+    return json.dumps([to_json(x) for x in objs]).encode('utf-8')
+
+def loads_json(data:bytes) -> list[Player]:
+    return [Player.from_json(x) for x in json.loads(data)]
+
+def main(count:int=100000, repeat:int=10):
+    objs = players(count)
+    formats = {
+        'codec': (lambda: pack_models(objs), lambda data: list(iter_unpack_models(data))),
+        'pickle': (lambda: pickle.dumps(objs, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        'json': (lambda: dumps_json(objs), loads_json)
+    }
+    data = {k: dump() for k, (dump, _) in formats.items()}
+    encode = {k: [] for k in formats.keys()}
+    decode = {k: [] for k in formats.keys()}
+    # Alternate the formats so all of them see the same machine load
+    for _ in range(repeat):
+        for name, (dump, load) in formats.items():
+            encode[name].append(timeit.timeit(dump, number=1))
+            decode[name].append(timeit.timeit(lambda: load(data[name]), number=1))
+    print(f"{count} players, best of {repeat}")
+    print(f"{'format':<8}{'bytes':>12}{'encode s':>12}{'decode s':>12}")
+    for name in formats.keys(): print(f"{name:<8}{len(data[name]):>12}{min(encode[name]):>12.3f}{min(decode[name]):>12.3f}")
+    print(f"codec / pickle: size {len(data['codec']) / len(data['pickle']):.2f}x, encode {min(encode['codec']) / min(encode['pickle']):.2f}x, decode {min(decode['codec']) / min(decode['pickle']):.2f}x")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,69 @@
+"""
+Measure the memory kept and the time spent decoding a player dump with from_json
+
+python tests/bench_models.py [COUNT]
+
+The "tables" run uses the shared string pool for the few fields that repeat and the prebuilt name to member tables. The "baseline" run switches both off, so every string is kept as decoded and names go through Enum.__getitem__ as before.
+"""
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multicraft import Status, Role, Mode, BackupStatus, ScheduleStatus, Player
+from multicraft import model
+
+TABLES = {'_intern': str, 'STATUSES': Status, 'ROLES': Role, 'MODES': Mode, 'BACKUP_STATUSES': BackupStatus}
+
+def dump(count:int) -> str:
+    # Names and ips are mostly unique, quit reasons come from a handful of messages
+    return json.dumps([{'id': str(x), 'name': f"player{x}", 'server_id': str(x % 200), 'level': '10', 'lastseen': '1700000000', 'banned': '', 'op': '', 'status': ('online', 'offline')[x % 2], 'ip': f"10.{x >> 16 & 255}.{x >> 8 & 255}.{x & 255}", 'previps': f"10.{x >> 16 & 255}.{x >> 8 & 255}.{x & 255},192.168.0.{x & 255}", 'quitreason': ('Disconnected', 'Timed out', 'Kicked', 'Internal Exception: java.io.IOException: An existing connection was forcibly closed by the remote host')[x % 4]} for x in range(count)])
+
+def retained(raw:str) -> float:
+    """
+    The MB still held by the players once the parsed JSON is dropped
+    """
+    model._strings.clear()
+    gc.collect()
+    tracemalloc.start()
+    rows = json.loads(raw)
+    players = [Player.from_json(rows.pop()) for _ in range(len(rows))]
+    del rows
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del players
+    return size / 1e6
+
+def use(values:dict):
+    for k, v in values.items(): setattr(model, k, v)
+
+def main(count:int=100000, repeat:int=10):
+    raw = dump(count)
+    rows = json.loads(raw)
+    runs = {'tables': {k: getattr(model, k) for k in TABLES.keys()}, 'baseline': TABLES}
+    memory = {}
+    times = {k: [] for k in runs.keys()}
+    try:
+        for name, values in runs.items():
+            use(values)
+            memory[name] = retained(raw)
+        # Alternate the runs so both see the same machine load
+        for _ in range(repeat):
+            for name, values in runs.items():
+                use(values)
+                times[name].append(timeit.timeit(lambda: [Player.from_json(dict(x)) for x in rows], number=1))
+    finally: use(runs['tables'])
+    print(f"{count} players, best of {repeat}")
+    print(f"{'run':<10}{'retained MB':>14}{'from_json s':>14}")
+    for name in runs.keys(): print(f"{name:<10}{memory[name]:>14.1f}{min(times[name]):>14.3f}")
+    print(f"tables / baseline: memory {memory['tables'] / memory['baseline']:.2f}x, from_json {min(times['tables']) / min(times['baseline']):.2f}x")
+    print(f"Role.from_int().to_int() x{count}: {min(timeit.repeat(lambda: [Role.from_int(40).to_int() for _ in range(count)], number=1, repeat=repeat)):.3f}s")
+    print(f"ScheduleStatus.from_int() x{count}: {min(timeit.repeat(lambda: [ScheduleStatus.from_int(3) for _ in range(count)], number=1, repeat=repeat)):.3f}s")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
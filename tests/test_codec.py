@@ -0,0 +1,90 @@
+"""
+Every model must come back from the binary format exactly as it went in
+"""
+import datetime
+import unittest
+
+from multicraft import Status, ScheduleStatus, BackupStatus, MulticraftException, User, Server, Command, ServerStatus, ServerResources, ChatMessage, Player, Schedule, Database, Backup, freeze, pack_model, pack_models, unpack_model, iter_unpack_models
+from multicraft.codec import LAYOUTS, STATUS_CODES, SCHEDULE_STATUS_CODES, BACKUP_STATUS_CODES
+
+# The format stores whole seconds
+TIME = datetime.datetime(2024, 5, 1, 12, 30, 15)
+
+def models() -> list:
+    return [
+        User(1, 'admin', 'admin@example.com', 'superuser', 'en', 'dark', 'secret', 'token', 'Europe/Berlin'),
+        Server(2, 'Survival', 1, '10.0.0.2', 25565, 20, 2048),
+        Command(3, 'kick', 2, 30, 0, 'kick', 'Kicked {1}', 'kick {1}', True),
+        ServerStatus(Status.online, 2, 20, ['Steve', 'Alex']),
+        ServerResources(12.5, 48.25, 1024),
+        ChatMessage('hello', 'Steve', TIME),
+        Player(4, 'Steve', 2, 10, TIME, False, True, Status.online, '10.0.0.3', '10.0.0.1,10.0.0.3', 'Quit'),
+        Schedule(5, 'restart', 2, TIME, TIME, 3600, 1, 0, ScheduleStatus.paused, 'now', False),
+        Database('db.example.com', 'server_2', 'user_2', 'hunter2', 'https://db.example.com', server_id=2),
+        Backup(BackupStatus.done, 'ftp://backup', 'ok', 'backup.zip', TIME)
+    ]
+
+def roundtrip(obj):
+    data = pack_model(obj)
+    res, offset = unpack_model(bytes(data))
+    assert offset == len(data)
+    return res
+
+class TestCodec(unittest.TestCase):
+    def test_every_layout(self):
+        objs = models()
+        self.assertEqual({type(x) for x in objs}, {x.cls for x in LAYOUTS})
+        for obj in objs:
+            with self.subTest(type(obj).__name__):
+                res = roundtrip(obj)
+                self.assertIs(type(res), type(obj))
+                self.assertEqual(freeze(res), freeze(obj))
+
+    def test_none_and_empty(self):
+        player = roundtrip(Player(4, '', 2))
+        self.assertEqual(player.name, '')
+        self.assertEqual((player.ip, player.previps, player.quitreason), (None, None, None))
+        self.assertEqual(freeze(player), freeze(Player(4, '', 2)))
+        status = roundtrip(ServerStatus(Status.offline, 0, 20, []))
+        self.assertEqual(status.players, [])
+        self.assertEqual(status.status, Status.offline)
+
+    def test_unicode(self):
+        message = roundtrip(ChatMessage('héllo wörld ✓', 'Stève', TIME))
+        self.assertEqual((message.text, message.name), ('héllo wörld ✓', 'Stève'))
+
+    def test_many(self):
+        objs = models() * 3
+        res = list(iter_unpack_models(pack_models(objs)))
+        self.assertEqual([freeze(x) for x in res], [freeze(x) for x in objs])
+
+    def test_block(self):
+        # Repeated strings are written once and indexed, missing values must survive that
+        objs = [Player(x, f"player{x}", 2, 10, TIME, False, False, Status.online if x % 3 else Status.offline, None, None, ('Quit', 'Kicked')[x % 2]) for x in range(100)]
+        data = pack_models(objs)
+        self.assertLess(len(data), len(pack_models(objs[:1])) * 100)
+        res = list(iter_unpack_models(data))
+        self.assertEqual([freeze(x) for x in res], [freeze(x) for x in objs])
+        self.assertEqual({x.quitreason for x in res}, {'Quit', 'Kicked'})
+        self.assertEqual({x.ip for x in res}, {None})
+        with self.assertRaises(MulticraftException): unpack_model(data)
+
+    def test_enum_codes(self):
+        # Codes are part of the format, changing one breaks every file already written
+        self.assertEqual(STATUS_CODES, {Status.online: 0, Status.offline: 1})
+        self.assertEqual(SCHEDULE_STATUS_CODES, {ScheduleStatus.scheduled: 0, ScheduleStatus.rescheduled: 1, ScheduleStatus.done: 2, ScheduleStatus.paused: 3})
+        self.assertEqual(BACKUP_STATUS_CODES, {BackupStatus.done: 0})
+        for codes, enum in ((STATUS_CODES, Status), (SCHEDULE_STATUS_CODES, ScheduleStatus), (BACKUP_STATUS_CODES, BackupStatus)):
+            self.assertEqual(set(codes.keys()), set(enum))
+        # Status is the first column after the block header of type byte and count
+        self.assertEqual(pack_model(ServerStatus(Status.offline, 0, 0, []))[5], 1)
+
+    def test_bad_input(self):
+        with self.assertRaises(MulticraftException): unpack_model(b'\xfe')
+        data = pack_model(ServerStatus(Status.online, 0, 0, []))
+        data[5] = 200
+        with self.assertRaises(MulticraftException): unpack_model(data)
+        with self.assertRaises(MulticraftException): pack_model(object())
+
+if __name__ == '__main__':
+    unittest.main()
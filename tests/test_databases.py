@@ -0,0 +1,47 @@
+"""
+FileLease must give a lease to exactly one process and take over leases whose process died
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from multicraft import FileLease
+
+ROOT = __file__.rsplit('tests', 1)[0]
+
+class TestFileLease(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_one_holder(self):
+        lease = FileLease(self.directory)
+        self.assertTrue(lease.acquire('a'))
+        self.assertFalse(FileLease(self.directory).acquire('a'))
+        self.assertTrue(lease.acquire('b'))
+        lease.release('a')
+        self.assertTrue(FileLease(self.directory).acquire('a'))
+
+    def test_processes(self):
+        code = f"import sys; from multicraft import FileLease; print(FileLease({self.directory!r}).acquire('a'))"
+        procs = [subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, stdout=subprocess.PIPE, text=True) for _ in range(8)]
+        self.assertEqual(sorted(x.communicate()[0].strip() for x in procs), ['False'] * 7 + ['True'])
+
+    def test_expired(self):
+        dead = FileLease(self.directory, ttl=0.1)
+        self.assertTrue(dead.acquire('a'))
+        time.sleep(0.2)
+        lease = FileLease(self.directory, ttl=0.1)
+        self.assertTrue(lease.acquire('a'))
+        # The late release of the expired holder must not drop the new lease
+        dead.release('a')
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'a.lease')))
+        lease.release('a')
+        self.assertEqual(os.listdir(self.directory), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+"import multicraft" must stay cheap, tkinter and requests are only loaded on first use
+"""
+import subprocess
+import sys
+import unittest
+
+ROOT = __file__.rsplit('tests', 1)[0]
+
+# Milliseconds, measured at about 5ms. The budget leaves room for slow machines but not for tkinter or requests
+IMPORT_BUDGET = 50
+HEAVY = ('tkinter', 'requests', 'asyncio', 'http.server', 'shelve', 'multiprocessing')
+
+def run(code:str, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+def import_time(code:str) -> float:
+    """
+    The best of three cumulative import times of multicraft in milliseconds
+    """
+    times = []
+    for _ in range(3):
+        res = run(code, '-X', 'importtime')
+        # -X importtime writes "import time: SELF | CUMULATIVE | NAME" to stderr
+        times += [int(x.split('|')[1]) / 1000 for x in res.stderr.splitlines() if x.startswith('import time:') and x.split('|')[2].strip() == 'multicraft']
+    return min(times)
+
+class TestImport(unittest.TestCase):
+    def test_import_is_lazy(self):
+        res = run(f"import sys, multicraft; print(','.join(x for x in {HEAVY!r} if x in sys.modules))")
+        self.assertEqual(res.stdout.strip(), '')
+
+    def test_import_budget(self):
+        ms = import_time('import multicraft')
+        print(f"\nimport multicraft: {ms:.1f}ms", file=sys.stderr)
+        self.assertLess(ms, IMPORT_BUDGET)
+
+    def test_star_import(self):
+        res = run(f"import sys; from multicraft import *; print(MulticraftAPI.__name__, MulticraftException.__name__, Player.__name__, 'MulticraftApp' in dir(), ','.join(x for x in {HEAVY!r} if x in sys.modules))")
+        self.assertEqual(res.stdout.split(), ['MulticraftAPI', 'MulticraftException', 'Player', 'False'])
+
+    def test_star_import_headless(self):
+        # None in sys.modules makes "import tkinter" fail, as it does without Tk
+        res = run("import sys; sys.modules['tkinter'] = None; from multicraft import *; import multicraft; print(multicraft.parse_log.__name__)")
+        self.assertEqual(res.stdout.strip(), 'parse_log')
+
+if __name__ == '__main__':
+    unittest.main()